@@ -25,4 +25,4 @@ dash_app.config.suppress_callback_exceptions = True
 create_dash_layout(dash_app)
 
 # Import routes module to ensure the routes are registered
-from app import routes
\ No newline at end of file
+from app import routes, api_routes
\ No newline at end of file
@@ -0,0 +1,208 @@
+import gzip
+import json
+import math
+import hashlib
+from flask import request, Response
+from app import app
+from app.data_service import data_service
+from app.figure_cache import VersionedLRU
+from app.history_store import HISTORY_DTYPE, SEASON_FIXTURES, WINDOW_SIZE
+from app.metrics import record_cache
+from app.premier_selector import calculate_form_scores
+from app.ranking import RANKING_METRICS
+from app.routes import parse_player_ids, pick_squad
+
+API_PREFIX = "/api/v1"
+
+# Players per page of a list, unless the client asks for another size
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Payloads smaller than this are sent as they are, since gzip would barely shrink them
+MIN_GZIP_SIZE = 1024
+GZIP_LEVEL = 6
+
+# Memory cap of the encoded payloads, in bytes of JSON and gzip
+API_CACHE_BYTES = 16 * 1024 * 1024
+
+# Seconds a client should wait before asking again while the data is loading
+RETRY_AFTER = 5
+
+# Position ids by the names used in the API
+POSITIONS = {'goalkeepers': 1, 'defenders': 2, 'midfielders': 3, 'forwards': 4}
+
+# Encoded payloads keyed by (request, data version)
+api_cache = VersionedLRU(API_CACHE_BYTES)
+
+# Class to hold one payload encoded once, as plain and gzipped JSON with its ETag
+class EncodedPayload:
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self.gzipped = gzip.compress(self.body, GZIP_LEVEL) if len(self.body) >= MIN_GZIP_SIZE else None
+        self.size = len(self.body) + (len(self.gzipped) if self.gzipped else 0)
+
+# Function to answer with a JSON error
+def error_response(status, message, headers=None):
+    return Response(json.dumps({'error': message}), status=status, mimetype='application/json', headers=headers)
+
+# Function to serve a payload built at most once per data version and query, answering revalidations with 304
+def cached_json(build):
+    snapshot = data_service.get_snapshot()
+    if snapshot is None:
+        return error_response(503, "Player data is still loading", {'Retry-After': str(RETRY_AFTER)})
+
+    # The same query in another parameter order shares the payload
+    key = (request.path, tuple(sorted(request.args.items(multi=True))))
+    encoded = api_cache.get(key, snapshot.version)
+    record_cache("api", encoded is not None)
+    if encoded is None:
+        try:
+            payload = build(snapshot)
+        except ValueError as e:
+            return error_response(400, str(e))
+        if payload is None:
+            return error_response(404, "Not found")
+        payload['version'] = snapshot.version
+        encoded = EncodedPayload(payload)
+        api_cache.put(key, snapshot.version, encoded, encoded.size)
+
+    # Each encoding gets its own ETag, so a cache never mixes up the two bodies
+    use_gzip = encoded.gzipped is not None and 'gzip' in request.accept_encodings
+    etag = encoded.etag + ("-gzip" if use_gzip else "")
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache', 'X-Data-Version': str(snapshot.version)}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(encoded.gzipped if use_gzip else encoded.body, mimetype='application/json', headers=headers)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    return response
+
+# Function to read an optional query parameter, raising ValueError when it is malformed
+def query_arg(name, kind, default=None, minimum=None):
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = kind(value)
+    except ValueError:
+        raise ValueError(f"Invalid value for '{name}': {request.args.get(name)}")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}")
+    return value
+
+# Function to cut a list down to the page asked for, returning the page and its details
+def paginate(items):
+    page = query_arg('page', int, 1, minimum=1)
+    per_page = min(query_arg('per_page', int, DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+    start = (page - 1) * per_page
+    return items[start:start + per_page], {
+        'page': page,
+        'per_page': per_page,
+        'total': len(items),
+        'pages': (len(items) + per_page - 1) // per_page,
+    }
+
+# Function to get the fields of a player sent by the API
+def player_json(player):
+    return {
+        'id': player.id,
+        'name': player.name,
+        'position': player.element_type,
+        'club': player.club,
+        'form': round(player.form, 4),
+        'predicted': round(player.predicted, 4),
+        'points': player.points,
+        'price': player.value / 10,
+    }
+
+# Function to read the form window asked for; windows past a whole season give the same form, so they are cut to one
+def window_arg():
+    return min(query_arg('window', int, WINDOW_SIZE, minimum=1), SEASON_FIXTURES)
+
+# Function to read a position given by name or id
+def parse_position(position):
+    position_id = POSITIONS.get(position.lower()) or (int(position) if position.isdigit() else None)
+    if position_id not in POSITIONS.values():
+        raise ValueError(f"Unknown position '{position}', expected one of {', '.join(POSITIONS)}")
+    return position_id
+
+
+# Ranked players of a position: ?k=&max_price=&club=&metric=&window=&fixture_weeks=&page=&per_page=
+@app.route(f'{API_PREFIX}/rankings/<position>')
+def api_rankings(position):
+    def build(snapshot):
+        position_id = parse_position(position)
+        metric = request.args.get('metric', 'form')
+        if metric not in RANKING_METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(RANKING_METRICS)}")
+        window = window_arg()
+        k = query_arg('k', int, len(snapshot.players), minimum=1)
+        players = snapshot.ranking_for(window).top_k(
+            position_id, k,
+            max_price=query_arg('max_price', float),
+            club=request.args.get('club') or None,
+            metric=metric,
+            fixture_weeks=query_arg('fixture_weeks', int, minimum=1),
+        )
+        page, pagination = paginate(players)
+        start = (pagination['page'] - 1) * pagination['per_page']
+        return {
+            'position': position_id,
+            'metric': metric,
+            'window': window,
+            **pagination,
+            'players': [dict(player_json(player), rank=start + rank) for rank, player in enumerate(page, 1)],
+        }
+    return cached_json(build)
+
+
+# Every player in table order: ?page=&per_page=
+@app.route(f'{API_PREFIX}/players')
+def api_players():
+    def build(snapshot):
+        rows, pagination = paginate(range(len(snapshot.players)))
+        return {**pagination, 'players': [player_json(player) for player in snapshot.players.rows(rows)]}
+    return cached_json(build)
+
+
+# One player's fixture history and form: ?window=
+@app.route(f'{API_PREFIX}/players/<int:player_id>')
+def api_player(player_id):
+    def build(snapshot):
+        matches = (snapshot.players.ids == player_id).nonzero()[0]
+        if not len(matches):
+            return None
+        player = snapshot.players[int(matches[0])]
+        window = window_arg()
+        history = snapshot.history.player_rows(player_id)
+        columns = {name: history[name].tolist() for name in HISTORY_DTYPE.names if name != 'element'}
+        return {
+            'player': player_json(player),
+            'form': {'window': window, 'score': float(calculate_form_scores(snapshot.history, [player_id], window)[0])},
+            'history': [dict(zip(columns, values)) for values in zip(*columns.values())],
+        }
+    return cached_json(build)
+
+
+# The best squad and starting XI for the predicted form: ?lock=1,2&exclude=3
+@app.route(f'{API_PREFIX}/squad')
+def api_squad():
+    def build(snapshot):
+        squad = pick_squad(
+            snapshot,
+            locked_ids=parse_player_ids(request.args.get('lock', '')),
+            excluded_ids=parse_player_ids(request.args.get('exclude', '')),
+        )
+        return {
+            'optimal': squad.optimal,
+            'cost': squad.cost / 10,
+            'projected_form': round(squad.projected_form, 4),
+            'starting_xi': [player_json(player) for player in squad.starting_xi],
+            'bench': [player_json(player) for player in squad.bench],
+        }
+    return cached_json(build)
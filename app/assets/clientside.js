@@ -0,0 +1,91 @@
+// Clientside callbacks for the dashboard rankings; renderRankings is used when CLIENTSIDE_MODE is on in dash_layout.py
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    premierpick: {
+        // Show the ranking and form window controls everywhere except on player pages
+        toggleControls: function(pathname) {
+            var onPlayerPage = Boolean(pathname) && pathname.startsWith('/player/');
+            return {display: onPlayerPage ? 'none' : 'block'};
+        },
+
+        // Filter, sort and render the ranking tables from the players store
+        renderRankings: function(store, pathname, filterText, maxPrice, sortBy) {
+            if (!store || (pathname && pathname.startsWith('/player/'))) {
+                return [];
+            }
+
+            var columns = store.players;
+            var filter = (filterText || '').trim().toLowerCase();
+            var metric = sortBy || 'form';
+            var players = [];
+            for (var i = 0; i < columns.id.length; i++) {
+                var player = {
+                    id: columns.id[i],
+                    name: columns.name[i],
+                    position: columns.position[i],
+                    club: columns.club[i],
+                    form: columns.form[i],
+                    predicted: columns.predicted[i],
+                    total_points: columns.points[i],
+                    value: columns.value[i],
+                };
+                if (filter && player.name.toLowerCase().indexOf(filter) === -1 && player.club.toLowerCase().indexOf(filter) === -1) {
+                    continue;
+                }
+                if (maxPrice && player.value > maxPrice) {
+                    continue;
+                }
+                player.value_per_cost = player.value ? player.total_points / player.value : 0;
+                players.push(player);
+            }
+            players.sort(function(a, b) { return b[metric] - a[metric]; });
+
+            function component(namespace, type, props) {
+                return {namespace: namespace, type: type, props: props};
+            }
+
+            function html(type, props) {
+                return component('dash_html_components', type, props);
+            }
+
+            function table(positionId, title, count) {
+                var rows = players.filter(function(player) { return player.position === positionId; }).slice(0, count).map(function(player) {
+                    return html('Tr', {children: [
+                        html('Td', {children: component('dash_core_components', 'Link', {children: player.name, href: '/player/' + player.name})}),
+                        html('Td', {children: player.form}),
+                        html('Td', {children: player.total_points}),
+                        html('Td', {children: player.value}),
+                    ]});
+                });
+                var header = html('Thead', {children: html('Tr', {children: ['Name', 'Form', 'Total Points', 'Player Value'].map(function(name) {
+                    return html('Th', {children: name});
+                })})});
+                return html('Div', {children: [
+                    html('H3', {children: title, style: store.title_style}),
+                    component('dash_bootstrap_components', 'Table', {
+                        children: [header, html('Tbody', {children: rows})],
+                        striped: true,
+                        bordered: true,
+                        hover: true,
+                        responsive: true,
+                        className: 'mt-4',
+                    }),
+                ]});
+            }
+
+            function row(left, right, style) {
+                return component('dash_bootstrap_components', 'Row', {children: [
+                    component('dash_bootstrap_components', 'Col', {children: left, md: 6}),
+                    component('dash_bootstrap_components', 'Col', {children: right, md: 6}),
+                ], style: style});
+            }
+
+            var counts = store.counts;
+            return [
+                row(table(1, 'Goalkeepers Form and Total Points', counts[1]), table(4, 'Forwards Form and Total Points', counts[4]),
+                    {'margin-bottom': '20px', 'background-color': store.background_color}),
+                row(table(2, 'Defenders Form and Total Points', counts[2]), table(3, 'Midfielders Form and Total Points', counts[3]),
+                    {'background-color': store.background_color}),
+            ];
+        },
+    },
+});
@@ -0,0 +1,133 @@
+import json
+import codecs
+
+# Bytes read from the response at a time while parsing
+CHUNK_SIZE = 64 * 1024
+
+# Fields kept from each item of the bootstrap-static lists; every other field is dropped as it is parsed
+BOOTSTRAP_FIELDS = {
+    'elements': ('id', 'web_name', 'element_type', 'team', 'total_points', 'now_cost'),
+    'teams': ('id', 'name', 'short_name'),
+    'events': ('id', 'deadline_time', 'finished', 'data_checked', 'is_current', 'is_next'),
+}
+
+# Top-level values kept as they are, used to tell an older payload from a newer one
+BOOTSTRAP_SCALARS = ('last_updated',)
+
+WHITESPACE = ' \t\n\r'
+
+_decoder = json.JSONDecoder()
+
+# Class to read JSON text from a stream of byte chunks, keeping only the unparsed part in memory
+class JsonStream:
+    def __init__(self, chunks, read_size=CHUNK_SIZE):
+        self.chunks = iter(chunks)
+        self.read_size = read_size
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.done = False
+
+    # Function to read more text into the buffer, dropping what has been parsed; returns False at the end of the stream
+    def fill(self, size=None):
+        size = size or self.read_size
+        if self.done:
+            return False
+        parts = [self.buffer[self.pos:]]
+        read = 0
+        while read < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                parts.append(self.text_decoder.decode(b'', final=True))
+                self.done = True
+                break
+            parts.append(self.text_decoder.decode(chunk))
+            read += len(chunk)
+        self.buffer = ''.join(parts)
+        self.pos = 0
+        return True
+
+    # Function to get the next character that is not whitespace, without consuming it
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    # Function to consume the next character, checking it is one of the expected ones
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at {self.pos} but found {char!r}")
+        self.pos += 1
+        return char
+
+    # Function to decode the next complete value, reading more of the stream until it fits in the buffer
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number cut off at the end of the buffer would decode as a shorter one, so wait for what follows it
+                if end < len(self.buffer) or self.done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            # Grow the buffer in proportion to the value, so a large value is not re-parsed chunk by chunk
+            self.fill(max(self.read_size, len(self.buffer) - self.pos))
+
+    # Function to iterate over the items of the array that starts at the current position
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+# Function to keep only the listed fields of an item
+def select_fields(item, fields):
+    if not isinstance(item, dict):
+        raise ValueError(f"Expected an object but found {item!r}")
+    return {field: item.get(field) for field in fields}
+
+# Function to parse bootstrap-static from byte chunks, keeping only the fields the app uses
+def parse_bootstrap(chunks, read_size=CHUNK_SIZE):
+    stream = JsonStream(chunks, read_size)
+    data = {}
+    stream.expect('{')
+    if stream.peek() == '}':
+        return data
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        fields = BOOTSTRAP_FIELDS.get(key)
+        if fields is not None and stream.peek() == '[':
+            data[key] = [select_fields(item, fields) for item in stream.items()]
+        else:
+            value = stream.value()  # Values the app does not use are parsed one at a time and dropped
+            if key in BOOTSTRAP_SCALARS:
+                data[key] = value
+        if stream.expect(',}') == '}':
+            return data
+
+# Function to reduce an already parsed bootstrap-static payload, such as one cached by an earlier version
+def reduce_bootstrap(data):
+    if not isinstance(data, dict):
+        return data
+    reduced = {key: data[key] for key in BOOTSTRAP_SCALARS if key in data}
+    for key, fields in BOOTSTRAP_FIELDS.items():
+        if key in data:
+            reduced[key] = [select_fields(item, fields) for item in data[key]]
+    return reduced
+
+# Function to parse a bootstrap-static response without holding the whole payload as Python objects
+def parse_bootstrap_response(response):
+    return parse_bootstrap(response.iter_content(CHUNK_SIZE))
@@ -0,0 +1,84 @@
+import os
+import json
+import zlib
+import struct
+
+RECORD_SUFFIX = ".fplc"
+
+# File header: magic, format version, payload codec, size of the metadata block and size of the payload
+MAGIC = b"FPLC"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sBBHQ")
+
+# Bytes reserved for the metadata block, so it can be rewritten in place without touching the payload
+META_SIZE = 512
+
+# Payload codecs: the payload as compact JSON, or that JSON compressed with zlib
+CODECS = {None: 0, "zlib": 1}
+CODEC_NAMES = {code: name for name, code in CODECS.items()}
+
+# zlib level used when compressing; level 1 keeps most of the saving at a fraction of the cost
+COMPRESSION_LEVEL = 1
+
+# Function to encode the metadata block, padded to its reserved size
+def encode_meta(meta):
+    encoded = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    if len(encoded) > META_SIZE:
+        raise ValueError(f"Cache metadata is larger than {META_SIZE} bytes")
+    return encoded.ljust(META_SIZE, b' ')
+
+# Function to write a payload and its metadata to a temp file and rename it over the record
+def write_record(path, data, meta, compression=None):
+    if compression not in CODECS:
+        raise ValueError(f"Unknown cache compression '{compression}'")
+
+    # Payloads are plain JSON data, so they are stored as JSON; anyone able to write the data directory
+    # could otherwise run code in the app through a pickled payload
+    payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if compression == "zlib":
+        payload = zlib.compress(payload, COMPRESSION_LEVEL)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, CODECS[compression], META_SIZE, len(payload)))
+        f.write(encode_meta(meta))
+        f.write(payload)
+    os.replace(temp_path, path)
+
+# Function to read the header of a record, checking it is one this version can read
+def read_header(f, path):
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError(f"Cache record {path} is truncated")
+    magic, version, codec, meta_size, payload_size = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION or codec not in CODEC_NAMES:
+        raise ValueError(f"Cache record {path} has an unknown format")
+    return codec, meta_size, payload_size
+
+# Function to read only the metadata of a record
+def read_meta(f, meta_size):
+    try:
+        return json.loads(f.read(meta_size))
+    except ValueError:
+        return {}  # A damaged metadata block only makes the payload look stale
+
+# Function to read a record's payload and metadata
+def read_record(path):
+    with open(path, 'rb') as f:
+        codec, meta_size, payload_size = read_header(f, path)
+        meta = read_meta(f, meta_size)
+        payload = f.read(payload_size)
+    if len(payload) != payload_size:
+        raise ValueError(f"Cache record {path} is truncated")
+    if CODEC_NAMES[codec] == "zlib":
+        payload = zlib.decompress(payload)
+    return json.loads(payload), meta
+
+# Function to rewrite only the metadata block of a record, leaving the payload untouched
+def update_meta(path, meta):
+    encoded = encode_meta(meta)
+    with open(path, 'r+b') as f:
+        _, meta_size, _ = read_header(f, path)
+        if meta_size != len(encoded):
+            raise ValueError(f"Cache record {path} has a metadata block of {meta_size} bytes")
+        f.write(encoded)
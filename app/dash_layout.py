@@ -1,10 +1,12 @@
 import pandas as pd
 import dash_bootstrap_components as dbc
-from dash import dcc, html, callback_context, ALL
+from dash import dcc, html, callback_context, no_update, ALL, ClientsideFunction
 from dash.exceptions import PreventUpdate
 from dash.dependencies import Input, Output, State
-from app.player_stats_layout import load_player_stats
-from app.premier_selector import goalkeepers, defenders, midfielders, forwards
+from app.player_stats_layout import load_player_stats, prerender_in_background
+from app.data_service import data_service
+from app.history_store import WINDOW_SIZE
+from app.metrics import record_cache, time_stage
 
 background_color = 'darkgray'
 text_color = 'black' if background_color == 'darkgray' else 'white'
@@ -18,10 +20,40 @@ title_style = {
     'margin-top': '30px',
 }
 
+# Update intervals in milliseconds, while the data is loading and once it is ready
+LOADING_INTERVAL = 2000
+REFRESH_INTERVAL = 300000
+
+# Send the ranked players to the browser once and sort, filter and navigate there instead of on the server
+CLIENTSIDE_MODE = False
+
+# Metrics the rankings can be sorted by in clientside mode
+SORT_OPTIONS = [
+    {'label': 'Form', 'value': 'form'},
+    {'label': 'Predicted Form', 'value': 'predicted'},
+    {'label': 'Total Points', 'value': 'total_points'},
+    {'label': 'Points per £m', 'value': 'value_per_cost'},
+]
+
+# Numbers of recent fixtures the form shown in the rankings can be worked out over
+FORM_WINDOW_OPTIONS = [
+    {'label': 'Form over the last 3 fixtures', 'value': 3},
+    {'label': 'Form over the last 5 fixtures', 'value': 5},
+    {'label': 'Form over the last 7 fixtures', 'value': 7},
+    {'label': 'Form over the last 10 fixtures', 'value': 10},
+    {'label': 'Form over the whole season', 'value': 38},
+]
+FORM_WINDOWS = tuple(option['value'] for option in FORM_WINDOW_OPTIONS)
+
+# Function to read the form window picked, falling back to the default for a value the dropdown does not offer
+def form_window(value):
+    return value if value in FORM_WINDOWS else WINDOW_SIZE
+
 # Function to generate table from DataFrame
 def generate_table_from_dataframe(df, title):
-    # Modify the DataFrame to make player names clickable
-    df['Name'] = df['Name'].apply(lambda name: html.A(name, href=f"/player/{name}", id={'type': 'player-link', 'index': name}))
+    # Modify the DataFrame to make player names clickable, keyed by player id since names can repeat
+    ids = df.pop('ID')
+    df['Name'] = [html.A(name, href=f"/player/{name}", id={'type': 'player-link', 'index': player_id}) for name, player_id in zip(df['Name'], ids.tolist())]
 
     # Convert DataFrame to HTML table
     table = dbc.Table.from_dataframe(
@@ -39,8 +71,127 @@ def generate_table_from_dataframe(df, title):
     ])
 
 
+# Rendered ranking tables of the latest snapshot version and form window, as ((version, window), component tree)
+_rendered_rankings = (None, None)
+
+# Function to render the ranking tables of a snapshot once per data version and form window
+def render_rankings(snapshot, window=WINDOW_SIZE):
+    global _rendered_rankings
+    key, rankings = _rendered_rankings
+    record_cache("rankings", key == (snapshot.version, window))
+    if key == (snapshot.version, window):
+        return rankings
+    with time_stage("render_rankings"):
+        goalkeepers, defenders, midfielders, forwards = snapshot.selection(window)
+        rankings = build_rankings(goalkeepers, defenders, midfielders, forwards)
+    _rendered_rankings = ((snapshot.version, window), rankings)
+
+    # The players on the rankings are the most likely to be opened next
+    prerender_in_background(snapshot, goalkeepers + defenders + midfielders + forwards)
+    return rankings
+
+
+# Function to build the ranking tables of the players selected for each position
+def build_rankings(goalkeepers, defenders, midfielders, forwards):
+    # Convert player data to DataFrame
+    goalkeepers_df = pd.DataFrame([(p.id, p.name, p.form, p.points, (p.value/10)) for p in goalkeepers], columns=["ID", "Name", "Form", "Total Points", "Player Value"])
+    defenders_df = pd.DataFrame([(p.id, p.name, p.form, p.points, (p.value/10)) for p in defenders], columns=["ID", "Name", "Form", "Total Points", "Player Value"])
+    midfielders_df = pd.DataFrame([(p.id, p.name, p.form, p.points, (p.value/10)) for p in midfielders], columns=["ID", "Name", "Form", "Total Points", "Player Value"])
+    forwards_df = pd.DataFrame([(p.id, p.name, p.form, p.points, (p.value/10)) for p in forwards], columns=["ID", "Name", "Form", "Total Points", "Player Value"])
+
+    goalkeepers_table = generate_table_from_dataframe(goalkeepers_df, "Goalkeepers Form and Total Points")
+    defenders_table = generate_table_from_dataframe(defenders_df, "Defenders Form and Total Points")
+    midfielders_table = generate_table_from_dataframe(midfielders_df, "Midfielders Form and Total Points")
+    forwards_table = generate_table_from_dataframe(forwards_df, "Forwards Form and Total Points")
+
+    return html.Div([
+        dbc.Row([
+            dbc.Col(goalkeepers_table, md=6),
+            dbc.Col(forwards_table, md=6),
+        ], style={'margin-bottom': '20px', 'background-color': background_color}),
+        dbc.Row([
+            dbc.Col(defenders_table, md=6),
+            dbc.Col(midfielders_table, md=6),
+        ], style={'background-color': background_color}),
+    ])
+
+
+# Compact player data of the latest snapshot version and form window, as ((version, window), store data)
+_compact_players = (None, None)
+
+# Function to build the compact, column-wise player data sent to the browser once per data version and form window
+def compact_players(snapshot, window=WINDOW_SIZE):
+    global _compact_players
+    key, data = _compact_players
+    record_cache("players_store", key == (snapshot.version, window))
+    if key == (snapshot.version, window):
+        return data
+
+    players = snapshot.ranking_for(window).players
+    data = {
+        'version': snapshot.version,
+        'window': window,
+        'players': {
+            'id': players.ids.tolist(),
+            'name': players.name_column().tolist(),
+            'position': players.position_ids.tolist(),
+            'club': players.club_column().tolist(),
+            'form': players.forms.round(2).tolist(),
+            'predicted': players.predicted.round(2).tolist(),
+            'points': players.points.tolist(),
+            'value': (players.values / 10).tolist(),
+        },
+        # Table sizes and styles match the server rendered rankings
+        'counts': {1: len(snapshot.goalkeepers), 2: len(snapshot.defenders), 3: len(snapshot.midfielders), 4: len(snapshot.forwards)},
+        'title_style': title_style,
+        'background_color': background_color,
+    }
+    _compact_players = ((snapshot.version, window), data)
+    return data
+
+
+# Function to create the sort and filter controls of the clientside rankings
+def ranking_controls():
+    return html.Div(
+        dbc.Row([
+            dbc.Col(dbc.Input(id='player-filter', placeholder="Filter by player or club", debounce=True), md=4),
+            dbc.Col(dbc.Input(id='max-price', type='number', placeholder="Max price (£m)", min=0, step=0.5, debounce=True), md=3),
+            dbc.Col(dcc.Dropdown(id='sort-by', options=SORT_OPTIONS, value='form', clearable=False), md=3),
+        ], className="mt-4 justify-content-center"),
+        id='rankings-controls',
+    )
+
+
+# Function to create the control choosing how many recent fixtures the form is worked out over
+def form_window_control():
+    return html.Div(
+        dbc.Row(
+            dbc.Col(dcc.Dropdown(id='form-window', options=FORM_WINDOW_OPTIONS, value=WINDOW_SIZE, clearable=False), md=4),
+            className="mt-4 justify-content-center",
+        ),
+        id='form-window-controls',
+    )
+
+
+# Function to show a placeholder while the player data is loading
+def loading_message():
+    return html.Div(
+        dbc.Spinner(html.P("Loading player data...", style=title_style)),
+        className="mt-4 text-center"
+    )
+
+
 # Function to create the layout of your Dash app
-def create_dash_layout(app):
+def create_dash_layout(app, clientside=CLIENTSIDE_MODE):
+    # In clientside mode the rankings are rendered in the browser from the players store
+    clientside_components = []
+    if clientside:
+        clientside_components = [
+            ranking_controls(),
+            html.Div(id='rankings-container', className="mt-4"),
+            dcc.Store(id='players-store'),
+        ]
+
     app.layout = dbc.Container(
         [
             dcc.Location(id='url', refresh=False),
@@ -49,10 +200,13 @@ def create_dash_layout(app):
                     html.H1("Premier Pick Dashboard", className="mt-4 text-center") 
                 )
             ),
+            form_window_control(),
+            *clientside_components,
             html.Div(id='graphs-container', className="mt-4"),
+            dcc.Store(id='rendered-view'),
             dcc.Interval(
                 id='interval-component',
-                interval=300000,  # Update interval in milliseconds
+                interval=LOADING_INTERVAL,  # Update interval in milliseconds
                 n_intervals=0
             )
         ],
@@ -60,36 +214,44 @@ def create_dash_layout(app):
     )
 
     @app.callback(
-        Output('graphs-container', 'children'),
+        [Output('graphs-container', 'children'),
+         Output('interval-component', 'interval'),
+         Output('rendered-view', 'data')],
         [Input('interval-component', 'n_intervals'),
-         Input('url', 'pathname')]
+         Input('url', 'pathname'),
+         Input('form-window', 'value')],
+        [State('rendered-view', 'data')]
     )
-    def update_layout(n, pathname):
+    def update_layout(n, pathname, window, rendered_view):
+        snapshot = data_service.get_snapshot()
+        if snapshot is None:
+            # Poll quickly until the background warm-up has finished
+            return loading_message(), LOADING_INTERVAL, None
+
+        # The page already shows this data version and form window, so a refresh tick has nothing to send
+        window = form_window(window)
+        view = [snapshot.version, pathname, window]
+        if rendered_view == view:
+            return no_update, no_update, no_update
+
         if pathname and pathname.startswith("/player/"):
             player_name = pathname.split("/player/")[-1]
-            return load_player_stats(player_name)
+            return load_player_stats(player_name), REFRESH_INTERVAL, view
+        elif clientside:
+            return None, REFRESH_INTERVAL, view
         else:
-            # Convert player data to DataFrame
-            goalkeepers_df = pd.DataFrame([(p.name, p.form, p.points, (p.value/10)) for p in goalkeepers], columns=["Name", "Form", "Total Points", "Player Value"])
-            defenders_df = pd.DataFrame([(p.name, p.form, p.points, (p.value/10)) for p in defenders], columns=["Name", "Form", "Total Points", "Player Value"])
-            midfielders_df = pd.DataFrame([(p.name, p.form, p.points, (p.value/10)) for p in midfielders], columns=["Name", "Form", "Total Points", "Player Value"])
-            forwards_df = pd.DataFrame([(p.name, p.form, p.points, (p.value/10)) for p in forwards], columns=["Name", "Form", "Total Points", "Player Value"])
-
-            goalkeepers_table = generate_table_from_dataframe(goalkeepers_df, "Goalkeepers Form and Total Points")
-            defenders_table = generate_table_from_dataframe(defenders_df, "Defenders Form and Total Points")
-            midfielders_table = generate_table_from_dataframe(midfielders_df, "Midfielders Form and Total Points")
-            forwards_table = generate_table_from_dataframe(forwards_df, "Forwards Form and Total Points")
-
-            return html.Div([
-                dbc.Row([
-                    dbc.Col(goalkeepers_table, md=6),
-                    dbc.Col(forwards_table, md=6),
-                ], style={'margin-bottom': '20px', 'background-color': background_color}),
-                dbc.Row([
-                    dbc.Col(defenders_table, md=6),
-                    dbc.Col(midfielders_table, md=6),
-                ], style={'background-color': background_color}),
-            ])
+            return render_rankings(snapshot, window), REFRESH_INTERVAL, view
+
+    # The form window only applies to the rankings, so hide it on player pages
+    app.clientside_callback(
+        ClientsideFunction(namespace='premierpick', function_name='toggleControls'),
+        Output('form-window-controls', 'style'),
+        Input('url', 'pathname'),
+    )
+
+    if clientside:
+        register_clientside_callbacks(app)
+        return
 
     @app.callback(
         Output('url', 'pathname'),
@@ -98,22 +260,52 @@ def create_dash_layout(app):
     )
     def navigate_to_player_dashboard(n_clicks, ids):
         ctx = callback_context
-        if not ctx.triggered:
+        if not ctx.triggered or not ctx.triggered[0]['value']:
             raise PreventUpdate
 
-        link_id = ctx.triggered[0]['prop_id'].split('.')[0]
-        player_name = None
-        for i, id_dict in enumerate(ids):
-            if id_dict['type'] == 'player-link' and id_dict['index'] == link_id:
-                player_name = ids[i]['index']
-                break
-
-        if player_name:
-            return f"/player/{player_name}"
+        # The triggering link's id holds the player id, so look the player up directly
+        snapshot = data_service.get_snapshot()
+        player = snapshot.index.get_player(ctx.triggered_id['index']) if snapshot else None
+        if player:
+            return f"/player/{player['web_name']}"
         else:
             raise PreventUpdate
 
 
+# Function to register the callbacks of clientside mode, where only player pages need the server
+def register_clientside_callbacks(app):
+    @app.callback(
+        Output('players-store', 'data'),
+        [Input('interval-component', 'n_intervals'),
+         Input('form-window', 'value')],
+        [State('players-store', 'data')]
+    )
+    def update_players_store(n, window, store):
+        # Only send the players again when the data version or form window has moved
+        snapshot = data_service.get_snapshot()
+        window = form_window(window)
+        if snapshot is None or (store and store['version'] == snapshot.version and store.get('window') == window):
+            return no_update
+        return compact_players(snapshot, window)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='premierpick', function_name='toggleControls'),
+        Output('rankings-controls', 'style'),
+        Input('url', 'pathname'),
+    )
+
+    # Player names are rendered as dcc.Link, so navigating to a player needs no callback at all
+    app.clientside_callback(
+        ClientsideFunction(namespace='premierpick', function_name='renderRankings'),
+        Output('rankings-container', 'children'),
+        [Input('players-store', 'data'),
+         Input('url', 'pathname'),
+         Input('player-filter', 'value'),
+         Input('max-price', 'value'),
+         Input('sort-by', 'value')]
+    )
+
+
 
 
 
@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+from app.premier_selector import build_snapshot, update_snapshot
+from app.snapshot_store import SharedSnapshotReader
+from app.refresh_scheduler import RefreshScheduler, ERROR_INTERVAL
+
+# Directory of snapshots published by app.snapshot_loader. When set, this process only attaches to them.
+SNAPSHOT_DIR_ENV = "PREMIERPICK_SNAPSHOT_DIR"
+
+# Class to own the current data snapshot and build it off the request path
+class DataService:
+    def __init__(self, builder, updater=None, scheduled=False):
+        self.builder = builder
+        self.updater = updater
+        self.snapshot = None
+        self.version = 0
+        self.error = None
+        self.retry_at = 0  # No warm-up starts before this time after a failed build
+        self.warmup_thread = None
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()  # Held for the whole of a build, so only one runs at a time
+
+        # Keeps the snapshot fresh after the warm-up, refreshing more often around deadlines and matches
+        self.scheduler = RefreshScheduler(self) if scheduled else None
+
+    # Function to check whether a snapshot has been built
+    def is_ready(self):
+        return self.snapshot is not None
+
+    # Function to get the current snapshot, or None while it is still being built
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.start_warmup()
+        return snapshot
+
+    # Function to block until the snapshot has been built
+    def wait_for_snapshot(self, timeout=None):
+        if self.snapshot is None:
+            thread = self.start_warmup()
+            if thread is not None:
+                thread.join(timeout)
+        return self.snapshot
+
+    # Function to start building the snapshot in a background thread
+    def start_warmup(self):
+        if self.snapshot is not None:
+            return None
+        with self.lock:
+            if self.snapshot is not None:
+                return None
+            if self.warmup_thread is None or not self.warmup_thread.is_alive():
+                if self.scheduler is not None and self.scheduler.is_running():
+                    return None  # The warm-up failed and the scheduler retries it on its own timer
+                if time.time() < self.retry_at:
+                    return None  # The last build failed, so the API is not asked again until the interval has passed
+                self.warmup_thread = threading.Thread(target=self.refresh, name="data-warmup", daemon=True)
+                self.warmup_thread.start()
+            if self.scheduler is not None:
+                self.scheduler.start()
+            return self.warmup_thread
+
+    # Function to build a new snapshot and publish it, updating the current one in place of a full rebuild when possible
+    def refresh(self, full=False):
+        if not self.build_lock.acquire(blocking=False):
+            # Another build is running, so wait for it and share what it built rather than fetching everything twice
+            with self.build_lock:
+                return self.snapshot if self.error is None else None
+        try:
+            return self.build(full)
+        finally:
+            self.build_lock.release()
+
+    # Function to build a snapshot and publish it, called with the build lock held
+    def build(self, full=False):
+        previous = self.snapshot
+        try:
+            if previous is not None and self.updater is not None and not full:
+                snapshot = self.updater(previous)
+            else:
+                snapshot = self.builder()
+        except Exception as e:
+            self.error = e
+            self.retry_at = time.time() + ERROR_INTERVAL
+            print(f"Error building data snapshot: {e}")
+            return None
+        if snapshot is previous:
+            self.error = None
+            return previous  # Nothing changed since the last refresh
+        with self.lock:
+            self.version += 1
+            snapshot.version = self.version
+            self.snapshot = snapshot
+            self.error = None
+            self.retry_at = 0
+        return snapshot
+
+# Function to create the data service of this process, shared with the loader process in production
+def create_data_service():
+    snapshot_dir = os.environ.get(SNAPSHOT_DIR_ENV)
+    if snapshot_dir:
+        return SharedSnapshotReader(snapshot_dir)
+    return DataService(build_snapshot, update_snapshot, scheduled=True)
+
+data_service = create_data_service()
@@ -0,0 +1,83 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# Default memory cap of the cached figures, in bytes of memory held by the parsed figures
+MAX_BYTES = 32 * 1024 * 1024
+
+# Function to measure the memory held by a parsed JSON value, counting objects shared within it once
+def json_size(value):
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return size
+
+# Class to hold values built from one data version, keyed by (key, version) and evicting the least recently used.
+# Only the latest version is kept, since values of older versions can never be asked for again.
+class VersionedLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Function to check whether a value is cached, without counting it as a use
+    def contains(self, key, version):
+        return (key, version) in self.entries
+
+    # Function to get a cached value, or None if it has not been built
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get((key, version))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((key, version))
+            self.hits += 1
+            return entry[0]
+
+    # Function to add a value with its size in bytes
+    def put(self, key, version, value, size):
+        with self.lock:
+            if self.version is not None and version < self.version:
+                return  # Built from a snapshot that has since been replaced
+            if version != self.version:
+                self.version = version
+                for old_key in [old_key for old_key in self.entries if old_key[1] != version]:
+                    self.size -= self.entries.pop(old_key)[1]
+
+            if (key, version) in self.entries:
+                self.size -= self.entries.pop((key, version))[1]
+            if size > self.max_bytes:
+                return
+            self.entries[(key, version)] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    # Function to drop every cached value
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+# Rendered player figures keyed by (player_id, data version)
+figure_cache = VersionedLRU(MAX_BYTES)
@@ -0,0 +1,112 @@
+import threading
+import numpy as np
+
+# Upcoming gameweeks covered by the matrix
+HORIZON = 8
+
+# Default number of upcoming gameweeks weighted when ranking by fixtures
+FIXTURE_WEEKS = 5
+
+# FPL difficulty ratings run from 1 (easiest) to 5 (hardest); a fixture of neutral difficulty weighs 1
+MAX_DIFFICULTY = 5
+NEUTRAL_DIFFICULTY = 3
+
+# Function to turn difficulty ratings into weights, easier fixtures weighing more
+def difficulty_weight(difficulty):
+    return (MAX_DIFFICULTY + 1 - difficulty) / (MAX_DIFFICULTY + 1 - NEUTRAL_DIFFICULTY)
+
+# Class to hold every team's fixtures over the upcoming gameweeks, as team x gameweek arrays.
+# A blank gameweek has no fixtures for the team and a double gameweek has two.
+class FixtureMatrix:
+    def __init__(self, team_ids, gameweeks, counts, difficulty, weights):
+        self.team_ids = team_ids
+        self.gameweeks = gameweeks
+        self.counts = counts          # Fixtures of each team in each gameweek
+        self.difficulty = difficulty  # Summed difficulty of those fixtures
+        self.weights = weights        # Summed weights of those fixtures
+
+        # Row of each team id, -1 for teams without upcoming fixtures
+        self.team_rows = np.full(int(team_ids.max()) + 1 if len(team_ids) else 1, -1, dtype=np.intp)
+        self.team_rows[team_ids] = np.arange(len(team_ids))
+        self.fixture_weight_cache = {}
+
+    # Function to get the matrix rows of a list of team ids
+    def rows_for(self, team_ids):
+        team_ids = np.asarray(team_ids, dtype=np.intp)
+        rows = np.full(len(team_ids), -1, dtype=np.intp)
+        known = (team_ids >= 0) & (team_ids < len(self.team_rows))
+        rows[known] = self.team_rows[team_ids[known]]
+        return rows
+
+    # Function to get each team's average fixture weight per gameweek over the next few gameweeks
+    def team_weights(self, weeks=FIXTURE_WEEKS):
+        weeks = min(weeks, len(self.gameweeks))
+        weights = self.fixture_weight_cache.get(weeks)
+        if weights is None:
+            if weeks:
+                weights = self.weights[:, :weeks].sum(axis=1) / weeks
+            else:
+                weights = np.ones(len(self.team_ids))  # The season is over, so nobody is weighted up or down
+            self.fixture_weight_cache[weeks] = weights
+        return weights
+
+    # Function to get the fixture weight of each player from their team ids, with one lookup for all of them
+    def fixture_weights(self, team_ids, weeks=FIXTURE_WEEKS):
+        rows = self.rows_for(team_ids)
+        weights = self.team_weights(weeks)
+        return np.where(rows >= 0, weights[np.maximum(rows, 0)] if len(weights) else 1.0, 1.0)
+
+# Function to build the matrix from the fixtures feed, starting at the first gameweek with an unplayed fixture
+def build_fixture_matrix(fixtures, horizon=HORIZON):
+    scheduled = [fixture for fixture in fixtures if fixture.get('event')]
+    count = len(scheduled)
+
+    def column(key, dtype=np.int64, default=0):
+        return np.fromiter((fixture.get(key) or default for fixture in scheduled), dtype=dtype, count=count)
+
+    events = column('event')
+    home_teams = column('team_h')
+    away_teams = column('team_a')
+    home_difficulty = column('team_h_difficulty', default=NEUTRAL_DIFFICULTY)
+    away_difficulty = column('team_a_difficulty', default=NEUTRAL_DIFFICULTY)
+    finished = column('finished', bool)
+
+    team_ids = np.unique(np.concatenate((home_teams, away_teams)))
+    unplayed = ~finished
+    if not unplayed.any():
+        empty = np.zeros((len(team_ids), 0))
+        return FixtureMatrix(team_ids, np.zeros(0, dtype=np.int64), empty.astype(np.int8), empty, empty)
+
+    # Gameweeks run on from the first one with an unplayed fixture, so a blank gameweek still gets a column
+    first = events[unplayed].min()
+    gameweeks = np.arange(first, min(first + horizon, events.max() + 1))
+    in_horizon = unplayed & (events < first + len(gameweeks))
+    columns = events[in_horizon] - first
+
+    counts = np.zeros((len(team_ids), len(gameweeks)), dtype=np.int8)
+    difficulty = np.zeros((len(team_ids), len(gameweeks)))
+    weights = np.zeros((len(team_ids), len(gameweeks)))
+    for teams, team_difficulty in ((home_teams, home_difficulty), (away_teams, away_difficulty)):
+        rows = np.searchsorted(team_ids, teams[in_horizon])
+        # add.at adds every fixture, so both fixtures of a double gameweek count
+        np.add.at(counts, (rows, columns), 1)
+        np.add.at(difficulty, (rows, columns), team_difficulty[in_horizon])
+        np.add.at(weights, (rows, columns), difficulty_weight(team_difficulty[in_horizon]))
+    return FixtureMatrix(team_ids, gameweeks, counts, difficulty, weights)
+
+# Fixtures payload the matrix was last built from, as (fixtures, matrix)
+_fixture_matrix = (None, None)
+_fixture_matrix_lock = threading.Lock()
+
+# Function to get the matrix of a fixtures payload, rebuilding it only when the payload's content changes.
+# A forced refresh parses a new payload even when nothing changed, so payloads are compared by content;
+# comparing them costs a fraction of hashing one, and list equality returns at once for the same object.
+def get_fixture_matrix(fixtures):
+    global _fixture_matrix
+    fixtures = fixtures or []
+    with _fixture_matrix_lock:
+        cached_fixtures, matrix = _fixture_matrix
+        if matrix is None or cached_fixtures != fixtures:
+            matrix = build_fixture_matrix(fixtures)
+            _fixture_matrix = (fixtures, matrix)
+        return matrix
@@ -0,0 +1,164 @@
+import os
+import time
+import joblib
+import numpy as np
+from app.fpl_cache import fpl_cache
+from app.history_loader import load_histories
+from app.history_store import WINDOW_SIZE
+
+MODEL_DIR = "models"
+
+# Bump whenever the features change, so artifacts trained on older features are not loaded
+MODEL_VERSION = 1
+
+# Features the model is trained on, in column order
+FEATURES = ['form', 'minutes', 'points_per_game', 'value', 'element_type', 'difficulty', 'was_home']
+
+# Difficulty used when a fixture is unknown, e.g. a blank gameweek
+NEUTRAL_DIFFICULTY = 3
+
+# Function to get the path of the model artifact
+def model_path(model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"form_model_v{MODEL_VERSION}.joblib")
+
+# Function to get each team's next unplayed fixture as (fixture id, difficulty, was_home)
+def next_fixtures(fixtures):
+    upcoming = {}
+    unplayed = [fixture for fixture in fixtures if fixture.get('event') and not fixture.get('finished')]
+    unplayed.sort(key=lambda fixture: (fixture['event'], fixture.get('kickoff_time') or ''))
+    for fixture in unplayed:
+        upcoming.setdefault(fixture['team_h'], (fixture['id'], fixture['team_h_difficulty'], True))
+        upcoming.setdefault(fixture['team_a'], (fixture['id'], fixture['team_a_difficulty'], False))
+    return upcoming
+
+# Function to get the difficulty of each history row's fixture for the player's side
+def fixture_difficulties(rows, fixtures):
+    size = max([fixture['id'] for fixture in fixtures] + [int(rows['fixture'].max()) if len(rows) else 0]) + 1
+    home_difficulty = np.full(size, NEUTRAL_DIFFICULTY)
+    away_difficulty = np.full(size, NEUTRAL_DIFFICULTY)
+    for fixture in fixtures:
+        home_difficulty[fixture['id']] = fixture['team_h_difficulty']
+        away_difficulty[fixture['id']] = fixture['team_a_difficulty']
+    return np.where(rows['was_home'], home_difficulty[rows['fixture']], away_difficulty[rows['fixture']])
+
+# Function to build features and targets from history, each fixture predicted from the ones before it
+def build_training_set(history, element_types, fixtures):
+    rows = np.asarray(history.rows)
+    row_numbers = np.arange(len(rows))
+    group_starts = np.repeat(history.offsets[:-1], np.diff(history.offsets))
+    places = row_numbers - group_starts
+    window_starts = np.maximum(group_starts, row_numbers - WINDOW_SIZE)
+
+    def prefix(name):
+        return np.concatenate(([0], np.cumsum(rows[name], dtype=np.int64)))
+
+    points = prefix('total_points')
+    minutes = prefix('minutes')
+    features = np.column_stack((
+        (points[row_numbers] - points[window_starts]) / WINDOW_SIZE,
+        (minutes[row_numbers] - minutes[window_starts]) / WINDOW_SIZE,
+        (points[row_numbers] - points[group_starts]) / np.maximum(places, 1),
+        rows['value'],
+        [element_types.get(player_id, 0) for player_id in rows['element']],
+        fixture_difficulties(rows, fixtures),
+        rows['was_home'],
+    ))
+
+    # A fixture needs at least one earlier fixture to be predicted from
+    usable = places > 0
+    return features[usable], rows['total_points'][usable]
+
+# Function to build the features of every player's next fixture
+def build_prediction_features(history, players_data, upcoming):
+    player_ids = [player_data['id'] for player_data in players_data]
+    positions = history.player_positions(player_ids)
+    found = positions >= 0
+    positions = np.maximum(positions, 0)  # Players without history are masked out by found
+
+    def window_sum(name):
+        totals = history.window_sums(name)
+        return np.where(found, totals[positions], 0) if len(totals) else np.zeros(len(player_ids))
+
+    counts = np.diff(history.offsets)
+    points = np.concatenate(([0], np.cumsum(history.column('total_points'), dtype=np.int64)))
+    total_points = points[history.offsets[1:]] - points[history.offsets[:-1]]
+    points_per_game = total_points / np.maximum(counts, 1)
+    next_fixture = [upcoming.get(player_data['team'], (None, NEUTRAL_DIFFICULTY, False)) for player_data in players_data]
+    return np.column_stack((
+        window_sum('total_points') / WINDOW_SIZE,
+        window_sum('minutes') / WINDOW_SIZE,
+        np.where(found, points_per_game[positions], 0) if len(counts) else np.zeros(len(player_ids)),
+        [player_data['now_cost'] for player_data in players_data],
+        [player_data['element_type'] for player_data in players_data],
+        [difficulty for _, difficulty, _ in next_fixture],
+        [was_home for _, _, was_home in next_fixture],
+    ))
+
+# Function to predict the next fixture's points of every player in one batch
+def predict_form(artifact, history, players_data, upcoming):
+    if not players_data:
+        return np.zeros(0)
+    return artifact['model'].predict(build_prediction_features(history, players_data, upcoming))
+
+# Function to train the form model on the history of every player
+def train_form_model(history, players_data, fixtures):
+    # scikit-learn is slow to import, so only pay for it when the model is trained
+    from sklearn.ensemble import RandomForestRegressor
+
+    element_types = {player_data['id']: player_data['element_type'] for player_data in players_data}
+    X, y = build_training_set(history, element_types, fixtures)
+    model = RandomForestRegressor(n_estimators=100, min_samples_leaf=5, random_state=42, n_jobs=-1)
+    model.fit(X, y)
+    return {
+        'model': model,
+        'version': MODEL_VERSION,
+        'features': FEATURES,
+        'trained_at': time.time(),
+        'samples': len(y),
+    }
+
+# Function to save a model artifact, replacing the old file in one step
+def save_form_model(artifact, model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+    filepath = model_path(model_dir)
+    temp_filepath = filepath + ".tmp"
+    joblib.dump(artifact, temp_filepath)
+    os.replace(temp_filepath, filepath)
+
+_loaded_artifact = (None, None)
+
+# Function to load the saved model artifact, or None if there is no artifact for this MODEL_VERSION
+def load_form_model(model_dir=MODEL_DIR):
+    global _loaded_artifact
+    filepath = model_path(model_dir)
+    try:
+        modified = os.path.getmtime(filepath)
+    except FileNotFoundError:
+        return None
+
+    # Only unpickle the artifact again when the file has been replaced
+    if _loaded_artifact[0] == (filepath, modified):
+        return _loaded_artifact[1]
+    try:
+        artifact = joblib.load(filepath)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Error loading form model from {filepath}: {e}")
+        return None
+    if artifact.get('version') != MODEL_VERSION:
+        return None
+    _loaded_artifact = ((filepath, modified), artifact)
+    return artifact
+
+# Function to fetch the latest data, train the form model and save it
+def main():
+    data = fpl_cache.get("bootstrap-static", "player_data.json")
+    fixtures = fpl_cache.get("fixtures", "team_data.json")
+    players_data = data.get('elements', [])
+    history = load_histories([player_data['id'] for player_data in players_data], data.get('events', []))
+
+    artifact = train_form_model(history, players_data, fixtures)
+    save_form_model(artifact)
+    print(f"Saved form model v{MODEL_VERSION} trained on {artifact['samples']} fixtures to {model_path()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import threading
+import zlib
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from app.bootstrap_parser import parse_bootstrap_response, reduce_bootstrap
+from app.cache_store import RECORD_SUFFIX, read_record, update_meta, write_record
+from app.fpl_transport import create_transport
+from app.metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS, record_cache, time_stage
+
+DATA_DIR = "fpl_data"
+
+# Seconds the cached data of each endpoint stays fresh
+ENDPOINT_TTLS = {
+    "bootstrap-static": 30 * 60,
+    "fixtures": 60 * 60,
+    "element-summary": 60 * 60,
+}
+DEFAULT_TTL = 10 * 60
+
+# Default number of pooled keep-alive connections to the API
+MAX_CONNECTIONS = 16
+
+# Default number of requests per second allowed against a single host
+RATE_LIMIT = 40
+
+# Number of threads revalidating stale entries in the background
+REFRESH_WORKERS = 4
+
+# Compression of the cache records on disk: None, or "zlib" to trade some load time for far smaller files
+CACHE_COMPRESSION = None
+
+# Endpoints parsed as a stream and cut down to the fields the app uses, and how to cut down a payload already parsed
+PAYLOAD_PARSERS = {"bootstrap-static": parse_bootstrap_response}
+PAYLOAD_REDUCERS = {"bootstrap-static": reduce_bootstrap}
+
+# Function to cut a cached payload down to the fields the app uses, for entries saved in full by earlier versions
+def reduce_payload(endpoint, data):
+    reducer = PAYLOAD_REDUCERS.get(endpoint)
+    return reducer(data) if reducer is not None else data
+
+# Function to check whether a payload is older than the one already cached
+def is_older(data, cached_data):
+    if not isinstance(data, dict) or not isinstance(cached_data, dict):
+        return False
+    if 'last_updated' not in data or 'last_updated' not in cached_data:
+        return False
+    return data['last_updated'] < cached_data['last_updated']
+
+# Function to get the metadata saved with a cached entry
+def entry_meta(entry):
+    return {'etag': entry.etag, 'last_modified': entry.last_modified, 'fetched_at': entry.fetched_at}
+
+# Class to hold one cached payload and its validators
+class CacheEntry:
+    def __init__(self, data, etag=None, last_modified=None, fetched_at=None):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+# Class to cache FPL API responses in memory and on disk
+class FplCache:
+    def __init__(self, data_dir=DATA_DIR, ttls=None, rate_limit=RATE_LIMIT, max_connections=MAX_CONNECTIONS, transport=None, compression=CACHE_COMPRESSION):
+        self.data_dir = data_dir
+        self.compression = compression
+        self.ttls = dict(ENDPOINT_TTLS) if ttls is None else ttls
+        # Live HTTP by default; a recording or replaying transport keeps the app off the real API
+        self.transport = create_transport(rate_limit, max_connections) if transport is None else transport
+        self.entries = {}
+        self.in_flight = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="fpl-cache-refresh")
+
+    # Function to get the TTL of an endpoint
+    def get_ttl(self, endpoint):
+        return self.ttls.get(endpoint.split('/')[0], DEFAULT_TTL)
+
+    # Function to get data for an endpoint, from memory, file or API
+    def get(self, endpoint, filename):
+        entry = self.entries.get(endpoint)
+        if entry is None:
+            entry = self.load_entry(endpoint, filename)
+        record_cache("fpl", entry is not None)
+        if entry is None:
+            return self.refresh(endpoint, filename)
+        if time.time() - entry.fetched_at >= self.get_ttl(endpoint):
+            # Serve the stale copy and revalidate it in the background
+            self.refresh_in_background(endpoint, filename)
+        return entry.data
+
+    # Function to fetch an endpoint, sharing the result with concurrent callers
+    def refresh(self, endpoint, filename):
+        with self.lock:
+            future = self.in_flight.get(endpoint)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[endpoint] = future
+        if not owner:
+            return future.result()
+
+        try:
+            data = self.fetch(endpoint, filename)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            with self.lock:
+                self.in_flight.pop(endpoint, None)
+
+    # Function to queue a refresh of a stale endpoint
+    def refresh_in_background(self, endpoint, filename):
+        with self.lock:
+            if endpoint in self.refreshing:
+                return
+            self.refreshing.add(endpoint)
+
+        def run():
+            try:
+                self.refresh(endpoint, filename)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error refreshing {endpoint}: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(endpoint)
+
+        self.refresh_pool.submit(run)
+
+    # Function to send a request to an endpoint through the transport
+    def request(self, endpoint, headers=None, stream=False):
+        group = endpoint.split('/')[0]
+        with UPSTREAM_SECONDS.time(endpoint=group):
+            response = self.transport.get(endpoint, headers, stream)
+        UPSTREAM_REQUESTS.inc(endpoint=group, status=response.status_code)
+        return response
+
+    # Function to fetch an endpoint without keeping it in the cache
+    def get_uncached(self, endpoint):
+        response = self.request(endpoint)
+        response.raise_for_status()
+        with time_stage("json_parse"):
+            return response.json()
+
+    # Function to request an endpoint, revalidating the cached copy if there is one
+    def fetch(self, endpoint, filename):
+        entry = self.entries.get(endpoint)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        parser = PAYLOAD_PARSERS.get(endpoint)
+        response = self.request(endpoint, headers, stream=parser is not None)
+        try:
+            if entry is not None:
+                record_cache("fpl_revalidate", response.status_code == 304)
+            if response.status_code == 304 and entry is not None:
+                entry.fetched_at = time.time()
+                self.save_meta(filename, entry)
+                return entry.data
+            response.raise_for_status()
+            with time_stage("json_parse"):
+                data = parser(response) if parser is not None else response.json()
+        finally:
+            response.close()  # Hand a streamed connection back to the pool
+
+        # Keep the cached copy if the API served an older one
+        if entry is not None and is_older(data, entry.data):
+            entry.fetched_at = time.time()
+            self.save_meta(filename, entry)
+            return entry.data
+
+        entry = CacheEntry(data, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        self.entries[endpoint] = entry
+        self.save_entry(filename, entry)
+        return data
+
+    # Function to get the path of an endpoint's cache record
+    def record_path(self, filename):
+        return os.path.join(self.data_dir, os.path.splitext(filename)[0] + RECORD_SUFFIX)
+
+    # Function to load a cached entry from file
+    def load_entry(self, endpoint, filename):
+        try:
+            with time_stage("cache_load"):
+                data, meta = read_record(self.record_path(filename))
+        except FileNotFoundError:
+            return self.load_legacy_entry(endpoint, filename)
+        except (OSError, ValueError, zlib.error) as e:
+            print(f"Error loading cached {endpoint}: {e}")
+            return None
+
+        entry = CacheEntry(reduce_payload(endpoint, data), meta.get('etag'), meta.get('last_modified'), meta.get('fetched_at', 0))
+        self.entries[endpoint] = entry
+        return entry
+
+    # Function to load an entry saved as pretty-printed JSON by earlier versions
+    def load_legacy_entry(self, endpoint, filename):
+        filepath = os.path.join(self.data_dir, filename)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f, time_stage("json_load"):
+                data = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return None
+
+        meta = {}
+        try:
+            with open(filepath + ".meta", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            pass
+
+        fetched_at = meta.get('fetched_at', os.path.getmtime(filepath))
+        entry = CacheEntry(reduce_payload(endpoint, data), meta.get('etag'), meta.get('last_modified'), fetched_at)
+        self.entries[endpoint] = entry
+        return entry
+
+    # Function to save a cached entry to file
+    def save_entry(self, filename, entry):
+        os.makedirs(self.data_dir, exist_ok=True)
+        write_record(self.record_path(filename), entry.data, entry_meta(entry), self.compression)
+
+    # Function to save the validators of a cached entry, rewriting only the record's metadata block
+    def save_meta(self, filename, entry):
+        try:
+            update_meta(self.record_path(filename), entry_meta(entry))
+        except (FileNotFoundError, ValueError):
+            self.save_entry(filename, entry)
+
+fpl_cache = FplCache()
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import zipfile
+import argparse
+import threading
+import requests
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+API_URL = os.environ.get("PREMIERPICK_API_URL", "https://fantasy.premierleague.com/api")
+
+# Transport used for every FPL request: live, record or replay
+TRANSPORT_ENV = "PREMIERPICK_TRANSPORT"
+ARCHIVE_ENV = "PREMIERPICK_ARCHIVE"
+LATENCY_ENV = "PREMIERPICK_REPLAY_LATENCY"
+DEFAULT_ARCHIVE = "fpl_archive.zip"
+
+# Response headers kept in an archive, the ones the cache revalidates with
+RECORDED_HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+
+# Class to space out requests made to the same host
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+# Function to get the shared rate limiter for a host
+def get_rate_limiter(url, rate):
+    host = urlparse(url).netloc
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None or limiter.interval != (1.0 / rate if rate else 0):
+            limiter = RateLimiter(rate)
+            _rate_limiters[host] = limiter
+    return limiter
+
+# Function to create a keep-alive session with a pool of connections
+def create_session(max_connections):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Function to build a requests Response from stored parts, so replayed responses behave like live ones
+def build_response(endpoint, status_code, headers, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response._content_consumed = True  # There is no connection behind it, so the body can be streamed and closed like a live one
+    response.url = f"{API_URL}/{endpoint}/"
+    response.encoding = 'utf-8'
+    return response
+
+# Class to send requests to the FPL API over pooled keep-alive connections
+class HttpTransport:
+    def __init__(self, rate_limit, max_connections):
+        self.rate_limit = rate_limit
+        self.session = create_session(max_connections)
+
+    # Function to send a rate limited request to an endpoint; a streamed body is read as it is parsed
+    def get(self, endpoint, headers=None, stream=False):
+        url = f"{API_URL}/{endpoint}/"
+        get_rate_limiter(url, self.rate_limit).wait()
+        return self.session.get(url, headers=headers, timeout=10, stream=stream)
+
+# Class to pass requests through to another transport and keep every response in an archive
+class RecordingTransport:
+    def __init__(self, inner, archive_path=DEFAULT_ARCHIVE):
+        self.inner = inner
+        self.archive_path = archive_path
+        self.responses = load_archive(archive_path) if os.path.exists(archive_path) else {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint, headers=None, stream=False):
+        response = self.inner.get(endpoint, headers, stream)
+        # A 304 has no body, so keep the full response recorded earlier
+        if response.status_code != 304:
+            recorded_headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+            with self.lock:
+                self.responses[endpoint] = (response.status_code, recorded_headers, response.content)
+        return response
+
+    # Function to write the recorded responses to the archive
+    def save(self):
+        with self.lock:
+            save_archive(self.responses, self.archive_path)
+
+# Class to serve recorded responses without touching the network, optionally slowed down like the real API
+class ReplayTransport:
+    def __init__(self, archive_path=DEFAULT_ARCHIVE, latency=0.0, jitter=0.0):
+        self.responses = load_archive(archive_path)
+        self.latency = latency
+        self.jitter = jitter
+
+    def get(self, endpoint, headers=None, stream=False):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        recorded = self.responses.get(endpoint)
+        if recorded is None:
+            return build_response(endpoint, 404, {}, b'{"detail": "Not recorded"}')
+        status_code, recorded_headers, content = recorded
+        etag = recorded_headers.get('ETag')
+        if etag and headers and headers.get('If-None-Match') == etag:
+            return build_response(endpoint, 304, recorded_headers, b'')
+        return build_response(endpoint, status_code, recorded_headers, content)
+
+# Function to write responses to a compressed archive, replacing the old file in one step
+def save_archive(responses, archive_path):
+    temp_path = archive_path + ".tmp"
+    index = {}
+    with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, (endpoint, (status_code, headers, content)) in enumerate(sorted(responses.items())):
+            member = f"responses/{number}"
+            index[endpoint] = {'status': status_code, 'headers': headers, 'member': member}
+            archive.writestr(member, content)
+        archive.writestr("index.json", json.dumps(index))
+    os.replace(temp_path, archive_path)
+
+# Function to read every response of an archive, as endpoint -> (status, headers, content)
+def load_archive(archive_path):
+    responses = {}
+    with zipfile.ZipFile(archive_path) as archive:
+        index = json.loads(archive.read("index.json"))
+        for endpoint, recorded in index.items():
+            responses[endpoint] = (recorded['status'], recorded['headers'], archive.read(recorded['member']))
+    return responses
+
+# Function to create the transport chosen by the environment: live by default, or record or replay an archive
+def create_transport(rate_limit, max_connections):
+    mode = os.environ.get(TRANSPORT_ENV, "live")
+    archive_path = os.environ.get(ARCHIVE_ENV, DEFAULT_ARCHIVE)
+    if mode == "replay":
+        return ReplayTransport(archive_path, float(os.environ.get(LATENCY_ENV, 0)))
+    transport = HttpTransport(rate_limit, max_connections)
+    if mode == "record":
+        transport = RecordingTransport(transport, archive_path)
+        atexit.register(transport.save)
+    elif mode != "live":
+        raise ValueError(f"Unknown FPL transport '{mode}'")
+    return transport
+
+# Function to record everything the app reads for a season: bootstrap, fixtures, every history and live gameweek
+def record_season(transport):
+    bootstrap = transport.get("bootstrap-static").json()
+    transport.get("fixtures")
+    for player_data in bootstrap.get('elements', []):
+        transport.get(f"element-summary/{player_data['id']}")
+    for event in bootstrap.get('events', []):
+        if event.get('finished'):
+            transport.get(f"event/{event['id']}/live")
+
+# Class to answer API requests from a replay transport, as a local stand-in for the FPL API
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    transport = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if not path.startswith("/api/"):
+            self.send_error(404)
+            return
+        endpoint = path[len("/api/"):].strip('/')
+        response = self.transport.get(endpoint, {'If-None-Match': self.headers.get('If-None-Match')})
+        self.send_response(response.status_code)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(response.content)))
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    def log_message(self, format, *args):
+        pass  # Keep load tests quiet
+
+# Function to serve an archive over HTTP, for load tests that should not depend on the real API
+def serve_archive(archive_path, port, latency=0.0, jitter=0.0):
+    handler = type('Handler', (ReplayRequestHandler,), {'transport': ReplayTransport(archive_path, latency, jitter)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Serving {archive_path} at http://127.0.0.1:{port}/api")
+    server.serve_forever()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Record the FPL API to an archive, or serve an archive as a local stand-in API")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record', help="record a season from the live API")
+    record_parser.add_argument('archive', nargs='?', default=DEFAULT_ARCHIVE)
+    serve_parser = subparsers.add_parser('serve', help="serve an archive over HTTP")
+    serve_parser.add_argument('archive', nargs='?', default=DEFAULT_ARCHIVE)
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    serve_parser.add_argument('--jitter', type=float, default=0.0, help="up to this many random seconds added on top")
+    args = parser.parse_args(args)
+
+    if args.command == 'record':
+        from app.fpl_cache import RATE_LIMIT, MAX_CONNECTIONS
+        transport = RecordingTransport(HttpTransport(RATE_LIMIT, MAX_CONNECTIONS), args.archive)
+        record_season(transport)
+        transport.save()
+        print(f"Recorded {len(transport.responses)} responses to {args.archive}")
+    else:
+        serve_archive(args.archive, args.port, args.latency, args.jitter)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,140 @@
+import time
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.fpl_cache import fpl_cache, MAX_CONNECTIONS
+from app.history_store import build_history_rows, build_history_table, save_history_table, load_history_table
+
+# Default number of histories fetched at the same time
+MAX_WORKERS = MAX_CONNECTIONS
+
+# Times a player's history is requested before it is left out, and seconds to wait between tries
+FETCH_ATTEMPTS = 3
+RETRY_DELAY = 1
+
+# Function to fetch one player's history from the API
+def fetch_player_history(player_id, cache=fpl_cache):
+    data = cache.get_uncached(f"element-summary/{player_id}")
+    return data.get('history', []) if data else []
+
+# Function to fetch the history of every player at once, leaving out players whose history could not be fetched
+def fetch_all_histories(player_ids, max_workers=MAX_WORKERS, cache=fpl_cache):
+    player_ids = [int(player_id) for player_id in player_ids]
+
+    def fetch(player_id):
+        for attempt in range(1, FETCH_ATTEMPTS + 1):
+            try:
+                return fetch_player_history(player_id, cache)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error fetching history for player {player_id} (attempt {attempt} of {FETCH_ATTEMPTS}): {e}")
+            if attempt < FETCH_ATTEMPTS:
+                time.sleep(RETRY_DELAY)
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        histories = dict(zip(player_ids, executor.map(fetch, player_ids)))
+    return {player_id: history for player_id, history in histories.items() if history is not None}
+
+# Function to fetch the histories missing from a table again, returning the new table and the ids of players fetched
+def fetch_missing_histories(history, max_workers=MAX_WORKERS, cache=fpl_cache):
+    if not history.missing:
+        return history, set()
+    histories = fetch_all_histories(history.missing, max_workers, cache)
+    if not histories:
+        return history, set()
+
+    # Gameweeks appended since the table was built are already in the fetched histories, so those rows are replaced
+    fetched = np.isin(history.column('element'), list(histories))
+    table = history.drop(fetched).append(build_history_table(histories).rows)
+    table.missing = history.missing - histories.keys()
+    return table, set(histories)
+
+# Function to get the last gameweek that is finished and has had its data checked, 0 before the first one
+def last_complete_round(events):
+    return max((event['id'] for event in events if event.get('finished') and event.get('data_checked')), default=0)
+
+# Function to load the history table from file, fetching every history again once it is stale.
+# The table only grows as gameweeks are completed, so it is stale when a gameweek was completed after it was saved,
+# however long ago that was. Histories that could not be fetched are left out rather than saved as empty,
+# and fetched again on the next load or update.
+def load_histories(player_ids, events=None, max_workers=MAX_WORKERS, cache=fpl_cache):
+    complete_round = last_complete_round(events) if events is not None else None
+    table = load_history_table(cache.data_dir)
+    if table is not None and complete_round is not None and table.settled_round() < complete_round:
+        table = None
+    if table is None:
+        player_ids = [int(player_id) for player_id in player_ids]
+        histories = fetch_all_histories(player_ids, max_workers, cache)
+        table = build_history_table(histories, set(player_ids) - histories.keys(), complete_round)
+        save_history_table(table, cache.data_dir)
+    elif table.missing:
+        table, fetched_ids = fetch_missing_histories(table, max_workers, cache)
+        if fetched_ids:
+            save_history_table(table, cache.data_dir)
+    return table
+
+# Function to split a player's live stats out for one fixture of a double gameweek
+def fixture_stats(element, fixture_id):
+    stats = {'total_points': 0}
+    for explain in element.get('explain', []):
+        if explain['fixture'] == fixture_id:
+            for stat in explain['stats']:
+                stats[stat['identifier']] = stat['value']
+                stats['total_points'] += stat['points']
+    return stats
+
+# Function to build the history rows of one finished gameweek from its live stats
+def fetch_gameweek_rows(event_id, players_data, fixtures, cache=fpl_cache):
+    live = cache.get_uncached(f"event/{event_id}/live")
+    live_elements = {element['id']: element for element in live.get('elements', [])}
+
+    # Fixtures each team played in the gameweek, none in a blank and two in a double
+    team_fixtures = {}
+    for fixture in fixtures:
+        if fixture.get('event') == event_id:
+            team_fixtures.setdefault(fixture['team_h'], []).append((fixture, True))
+            team_fixtures.setdefault(fixture['team_a'], []).append((fixture, False))
+
+    entries = []
+    for player_data in players_data:
+        element = live_elements.get(player_data['id'], {})
+        played = team_fixtures.get(player_data['team'], [])
+        for fixture, was_home in played:
+            if len(played) == 1:
+                stats = dict(element.get('stats', {}))
+            else:
+                stats = fixture_stats(element, fixture['id'])
+            stats.update({
+                'element': player_data['id'],
+                'fixture': fixture['id'],
+                'round': event_id,
+                'opponent_team': fixture['team_a'] if was_home else fixture['team_h'],
+                'was_home': was_home,
+                'value': player_data['now_cost'],
+            })
+            entries.append(stats)
+    return build_history_rows(entries)
+
+# Function to bring the history table up to the gameweeks finished since it was built, returning the ids of players whose rows changed
+def update_histories(history, events, players_data, fixtures, cache=fpl_cache):
+    previous = history
+    history, changed_ids = fetch_missing_histories(history, cache=cache)
+
+    settled_round = history.settled_round()
+    new_events = sorted(
+        event['id'] for event in events
+        if event.get('finished') and event.get('data_checked') and event['id'] > settled_round
+    )
+    if new_events:
+        # Rows after the settled gameweek were fetched while it was being played, so they are replaced by the final ones
+        provisional = history.column('round') > settled_round
+        changed_ids.update(history.column('element')[provisional].tolist())
+
+        new_rows = np.concatenate([fetch_gameweek_rows(event_id, players_data, fixtures, cache) for event_id in new_events])
+        history = history.drop(provisional).append(new_rows)
+        history.complete_round = new_events[-1]
+        changed_ids.update(new_rows['element'].tolist())
+
+    if history is not previous:
+        save_history_table(history, cache.data_dir)
+    return history, changed_ids
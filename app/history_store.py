@@ -0,0 +1,256 @@
+import os
+import json
+import numpy as np
+from app.fpl_cache import DATA_DIR
+
+HISTORY_FILE = "history.npy"
+HISTORY_META_FILE = "history.json"
+
+# Columns kept for every fixture in a player's history
+HISTORY_DTYPE = np.dtype([
+    ('element', 'i4'),
+    ('fixture', 'i4'),
+    ('round', 'i2'),
+    ('opponent_team', 'i2'),
+    ('was_home', '?'),
+    ('minutes', 'i2'),
+    ('goals_scored', 'i2'),
+    ('assists', 'i2'),
+    ('clean_sheets', 'i2'),
+    ('goals_conceded', 'i2'),
+    ('saves', 'i2'),
+    ('penalties_saved', 'i2'),
+    ('bonus', 'i2'),
+    ('total_points', 'i2'),
+    ('value', 'i2'),
+])
+
+# Number of most recent fixtures the rolling sums cover
+WINDOW_SIZE = 7
+
+# Fixtures each club plays in a season, so no form window needs to be longer
+SEASON_FIXTURES = 38
+
+# Venues a window can be limited to, by the value of was_home
+VENUES = {'home': True, 'away': False}
+
+# Multiplier placing every player's rounds after the previous player's, so (player, round) keys sort across the table
+ROUND_SPAN = 1 << 16
+
+# Function to get the values of a column that are added up in rolling windows; 'games' counts the fixtures
+def window_values(rows, name):
+    if name == 'games':
+        return np.ones(len(rows), dtype=np.int64)
+    values = rows[name]
+    if name == 'clean_sheets':
+        return values > 0  # Count each clean sheet kept once
+    return values
+
+# Class to hold every player's fixture history in one table, one row per player per fixture
+class HistoryTable:
+    def __init__(self, rows, missing=(), complete_round=None):
+        # Rows are grouped by player, each player's fixtures in the order they were played
+        self.rows = rows
+
+        # Players whose history could not be fetched, left out of the table until it is fetched again
+        self.missing = frozenset(missing)
+
+        # Last gameweek that was finished and data-checked when the rows were fetched; rows after it may be partial
+        self.complete_round = complete_round
+        self.player_ids, starts = np.unique(rows['element'], return_index=True)
+        self.offsets = np.append(starts, len(rows))
+
+        # Sums over each player's last WINDOW_SIZE fixtures, filled in per column on first use
+        self.window_totals = {}
+
+        # Running totals over the whole table per column and venue, filled in on first use
+        self.prefix_totals = {}
+        self.round_keys = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Function to get all history rows of a player
+    def player_rows(self, player_id):
+        i = np.searchsorted(self.player_ids, player_id)
+        if i == len(self.player_ids) or self.player_ids[i] != player_id:
+            return self.rows[0:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    # Function to get the last n history rows of a player
+    def last_fixtures(self, player_id, n=WINDOW_SIZE):
+        return self.player_rows(player_id)[-n:]
+
+    # Function to get one column for every row in the table
+    def column(self, name):
+        return self.rows[name]
+
+    # Function to get the highest gameweek in the table
+    def last_round(self):
+        return int(self.rows['round'].max()) if len(self.rows) else 0
+
+    # Function to get the last gameweek whose rows are final. A table saved without one may end part-way through its last gameweek.
+    def settled_round(self):
+        return self.complete_round if self.complete_round is not None else self.last_round() - 1
+
+    # Function to get the position of each player in player_ids, or -1 for players without history
+    def player_positions(self, player_ids):
+        player_ids = np.asarray(player_ids)
+        if len(self.player_ids) == 0:
+            return np.full(len(player_ids), -1)
+        positions = np.minimum(np.searchsorted(self.player_ids, player_ids), len(self.player_ids) - 1)
+        return np.where(self.player_ids[positions] == player_ids, positions, -1)
+
+    # Function to get a column summed over each player's last WINDOW_SIZE fixtures, in player_ids order
+    def window_sums(self, name):
+        totals = self.window_totals.get(name)
+        if totals is None:
+            prefix = np.concatenate(([0], np.cumsum(window_values(self.rows, name), dtype=np.int64)))
+            ends = self.offsets[1:]
+            starts = np.maximum(self.offsets[:-1], ends - WINDOW_SIZE)
+            totals = prefix[ends] - prefix[starts]
+            self.window_totals[name] = totals
+        return totals
+
+    # Function to get the number of fixtures in each player's last WINDOW_SIZE, fewer for players who have not played that many
+    def window_counts(self, size=WINDOW_SIZE):
+        return np.minimum(np.diff(self.offsets), size)
+
+    # Function to get the running total of a column over the whole table, optionally counting one venue only.
+    # Players' rows are contiguous, so the sum over any run of a player's rows is the difference of two entries.
+    def prefix_sums(self, name, venue=None):
+        key = (name, venue)
+        prefix = self.prefix_totals.get(key)
+        if prefix is None:
+            values = window_values(self.rows, name).astype(np.int64)
+            if venue is not None:
+                values = np.where(self.rows['was_home'] == VENUES[venue], values, 0)
+            prefix = self.prefix_totals[key] = np.concatenate(([0], np.cumsum(values)))
+        return prefix
+
+    # Function to get the first and last-plus-one row of each player's window, in player_ids order.
+    # A window is every fixture, optionally cut to a range of rounds, and then to the last n fixtures at a venue.
+    def window_bounds(self, last=None, rounds=None, venue=None):
+        starts, ends = self.offsets[:-1], self.offsets[1:]
+        if rounds is not None:
+            if self.round_keys is None:
+                groups = np.repeat(np.arange(len(self.player_ids), dtype=np.int64), np.diff(self.offsets))
+                self.round_keys = groups * ROUND_SPAN + self.rows['round']
+            base = np.arange(len(self.player_ids), dtype=np.int64) * ROUND_SPAN
+            first_round, last_round = rounds
+            starts = np.searchsorted(self.round_keys, base + first_round, side='left')
+            ends = np.searchsorted(self.round_keys, base + last_round, side='right')
+        if last is not None:
+            if venue is None:
+                starts = np.maximum(starts, ends - last)
+            else:
+                # Go back to the earliest row that still leaves only the last n fixtures at the venue in the window
+                games = self.prefix_sums('games', venue)
+                starts = np.maximum(starts, np.searchsorted(games, games[ends] - last, side='left'))
+        return starts, np.maximum(starts, ends)
+
+    # Function to get a column summed over a window of each player's fixtures, and the number of fixtures in it,
+    # in player_ids order. Each player's window costs two lookups however long it is.
+    def window_stats(self, name, last=None, rounds=None, venue=None):
+        starts, ends = self.window_bounds(last, rounds, venue)
+        totals = self.prefix_sums(name, venue)
+        games = self.prefix_sums('games', venue)
+        return totals[ends] - totals[starts], games[ends] - games[starts]
+
+    # Function to get a new table without the rows of a mask; its rolling sums are worked out again on first use
+    def drop(self, mask):
+        if not mask.any():
+            return self
+        return HistoryTable(np.asarray(self.rows)[~mask], self.missing, self.complete_round)
+
+    # Function to get a new table with rows added after each player's existing fixtures
+    def append(self, new_rows):
+        rows = np.concatenate((np.asarray(self.rows), new_rows))
+        table = HistoryTable(rows[np.argsort(rows['element'], kind='stable')], self.missing, self.complete_round)
+        if not self.window_totals or not len(new_rows):
+            return table
+
+        # Each new row's place in its player's group, after the old rows and earlier new rows
+        positions = table.player_positions(new_rows['element'])
+        old_counts = np.zeros(len(table.player_ids), dtype=np.int64)
+        old_positions = table.player_positions(self.player_ids)
+        old_counts[old_positions] = np.diff(self.offsets)
+        order = np.argsort(positions, kind='stable')
+        sorted_positions = positions[order]
+        first_new = np.searchsorted(sorted_positions, sorted_positions)
+        ranks = np.empty(len(new_rows), dtype=np.int64)
+        ranks[order] = np.arange(len(new_rows)) - first_new
+        places = old_counts[positions] + ranks
+
+        # Rows pushed out of the window by each new row, if the player already had a full window
+        leaving = places >= WINDOW_SIZE
+        leaving_rows = table.rows[table.offsets[positions[leaving]] + places[leaving] - WINDOW_SIZE]
+
+        # Carry the rolling sums forward in O(1) per new row instead of rescanning every history
+        for name, totals in self.window_totals.items():
+            new_totals = np.zeros(len(table.player_ids), dtype=np.int64)
+            new_totals[old_positions] = totals
+            np.add.at(new_totals, positions, window_values(new_rows, name).astype(np.int64))
+            np.subtract.at(new_totals, positions[leaving], window_values(leaving_rows, name).astype(np.int64))
+            table.window_totals[name] = new_totals
+        return table
+
+# Function to convert history entries from the API into table rows
+def build_history_rows(entries):
+    rows = np.zeros(len(entries), dtype=HISTORY_DTYPE)
+    for name in HISTORY_DTYPE.names:
+        rows[name] = [entry.get(name) or 0 for entry in entries]
+    return rows
+
+# Function to build a history table from an id -> history mapping, noting the players whose history is missing
+# and the last gameweek that was complete when the histories were fetched
+def build_history_table(histories, missing=(), complete_round=None):
+    player_ids = sorted(histories)
+    rows = build_history_rows([entry for player_id in player_ids for entry in histories[player_id]])
+    rows['element'] = np.repeat(player_ids, [len(histories[player_id]) for player_id in player_ids])
+    return HistoryTable(rows, missing, complete_round)
+
+# Function to get the metadata saved next to a history table
+def history_meta(table):
+    return {'missing': sorted(table.missing), 'complete_round': table.complete_round}
+
+# Function to save a history table and its metadata, replacing each old file in one step.
+# The rows go first, so a crash in between leaves metadata that only makes the next update refetch more.
+def save_history_table(table, data_dir=DATA_DIR):
+    os.makedirs(data_dir, exist_ok=True)
+    filepath = os.path.join(data_dir, HISTORY_FILE)
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, 'wb') as f:
+        np.save(f, table.rows)
+    os.replace(temp_filepath, filepath)
+
+    meta_filepath = os.path.join(data_dir, HISTORY_META_FILE)
+    with open(meta_filepath + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(history_meta(table), f)
+    os.replace(meta_filepath + ".tmp", meta_filepath)
+
+# Function to load the metadata saved next to a history table, empty for a table saved without it
+def load_history_meta(data_dir=DATA_DIR):
+    try:
+        with open(os.path.join(data_dir, HISTORY_META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Error loading history metadata from {data_dir}: {e}")
+        return {}
+
+# Function to load the saved history table, or None if it is missing
+def load_history_table(data_dir=DATA_DIR):
+    filepath = os.path.join(data_dir, HISTORY_FILE)
+    try:
+        rows = np.load(filepath, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Error loading history table from {filepath}: {e}")
+        return None
+    if rows.dtype != HISTORY_DTYPE:
+        return None
+    meta = load_history_meta(data_dir)
+    return HistoryTable(rows, meta.get('missing', ()), meta.get('complete_round'))
@@ -0,0 +1,136 @@
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+# Function to format label values for the Prometheus text format
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+# Class to count events, such as requests or cache hits, per set of labels
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, format_labels(self.labelnames, key), value) for key, value in sorted(self.values.items())]
+
+# Class to hold the latest value of a measurement, per set of labels
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = value
+
+# Class to count observations, such as latencies, into cumulative buckets
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][position] += 1
+            counts[1] += value
+
+    # Function to time a block of code into the histogram
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        counts = self.values.get(tuple(labels.get(name, "") for name in self.labelnames))
+        return sum(counts[0]) if counts else 0
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (bucket_counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), bucket_counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    samples.append((self.name + "_bucket", format_labels(self.labelnames, key, [('le', le)]), cumulative))
+                samples.append((self.name + "_sum", format_labels(self.labelnames, key), total))
+                samples.append((self.name + "_count", format_labels(self.labelnames, key), cumulative))
+        return samples
+
+# Function to render every metric in the Prometheus text exposition format
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram("premierpick_stage_seconds", "Time spent in each stage of the data and render pipeline", ("stage",))
+CALLBACK_SECONDS = Histogram("premierpick_callback_seconds", "Latency of Dash callbacks, serialization included", ("callback",))
+CACHE_REQUESTS = Counter("premierpick_cache_requests_total", "Lookups of the in-process caches", ("cache", "result"))
+UPSTREAM_REQUESTS = Counter("premierpick_upstream_requests_total", "Requests made to the FPL API", ("endpoint", "status"))
+UPSTREAM_SECONDS = Histogram("premierpick_upstream_request_seconds", "Latency of requests made to the FPL API", ("endpoint",))
+SNAPSHOT_VERSION = Gauge("premierpick_snapshot_version", "Version of the data snapshot being served")
+FIGURE_CACHE_BYTES = Gauge("premierpick_figure_cache_bytes", "Bytes of memory held by the figures in the figure cache")
+
+# Function to time a pipeline stage
+def time_stage(stage):
+    return STAGE_SECONDS.time(stage=stage)
+
+# Decorator to time every call of a function as a pipeline stage
+def timed_stage(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function to count a cache lookup
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -1,48 +1,26 @@
-import os
-import json
-import requests
+import numpy as np
+from app.fpl_cache import fpl_cache
+from app.history_store import WINDOW_SIZE, load_history_table
+from app.metrics import timed_stage
 
-DATA_DIR = "fpl_data"
+# Function to fetch the last n fixtures data for a player
+def fetch_last_fixtures(player_id, history=None, n=WINDOW_SIZE):
+    if history is None:
+        history = load_history_table(fpl_cache.data_dir)
+    if history is not None:
+        return history.last_fixtures(player_id, n)
 
-# Function to fetch and save data from the FPL API
-def fetch_and_save_data(endpoint, filename):
-    url = f"https://fantasy.premierleague.com/api/{endpoint}/"
-    response = requests.get(url, timeout=10)
-    data = response.json()
-    
-    os.makedirs(DATA_DIR, exist_ok=True)
-    with open(os.path.join(DATA_DIR, filename), 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
-
-# Function to load data from a file
-def load_data_from_file(filename):
-    try:
-        with open(os.path.join(DATA_DIR, filename), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except (json.JSONDecodeError, FileNotFoundError):
-        return None
-    
-# Function to fetch data, either from file or API
-def fetch_data(endpoint, filename):
-    data = load_data_from_file(filename)
-    if data is None:
-        fetch_and_save_data(endpoint, filename)
-        data = load_data_from_file(filename)
-    return data
-
-# Function to fetch last 7 fixtures data for a player
-def fetch_last_7_fixtures(player_id):
-    filename = f"player_{player_id}_fixtures.json"
-    data = fetch_data(f"element-summary/{player_id}", filename)
-    return data['history'][-7:] if data else []
+    # No history table saved yet, so fetch the player's history from the API
+    data = fpl_cache.get_uncached(f"element-summary/{player_id}")
+    return data['history'][-n:] if data else []
 
 
 # Function to calculate goalkeeper form
-def calculate_goalkeeper_form(player_id):
-    # Fetching last 7 fixtures data for the goalkeeper
-    fixtures = fetch_last_7_fixtures(player_id)
-    if not fixtures:
+@timed_stage("goalkeeper_form")
+def calculate_goalkeeper_form(player_id, history=None, window=WINDOW_SIZE):
+    # Fetching the last `window` fixtures data for the goalkeeper
+    fixtures = fetch_last_fixtures(player_id, history, window)
+    if len(fixtures) == 0:
         return 0  # No fixtures found, form score is 0
     
     # Initializing variables to store cumulative statistics
@@ -65,16 +43,17 @@ def calculate_goalkeeper_form(player_id):
     # Calculating form score
     # total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.3) + (bonus_points * 0.1) + (saves_made * 0.1) + (assists * 0) + (opponent_goals_scored * 0.3)
     total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.3) + (bonus_points * 0.1) + (saves_made * 0.1) + (assists * 0)
-    max_possible_score = (7 * (0.2 + 0.3 + 0.1 + 0.1 + 0))
+    max_possible_score = (len(fixtures) * (0.2 + 0.3 + 0.1 + 0.1 + 0))
     form_score = (total_weighted_score / max_possible_score) * 100
     
     return form_score
 
 # Function to calculate defender form
-def calculate_defender_form(player_id):
-    # Fetching last 7 fixtures data for the defender
-    fixtures = fetch_last_7_fixtures(player_id)
-    if not fixtures:
+@timed_stage("defender_form")
+def calculate_defender_form(player_id, history=None, window=WINDOW_SIZE):
+    # Fetching the last `window` fixtures data for the defender
+    fixtures = fetch_last_fixtures(player_id, history, window)
+    if len(fixtures) == 0:
         return 0  # No fixtures found, form score is 0
     
     # Initializing variables to store cumulative statistics
@@ -99,16 +78,17 @@ def calculate_defender_form(player_id):
     # Calculating form score
     # total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.3) + (bonus_points * 0.1) + (assists * 0.1) + (goals_scored * 0.2) + (opponent_goals_scored * 0.2) + (opponent_goals_conceded * 0.2)
     total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.3) + (bonus_points * 0.1) + (assists * 0.1) + (goals_scored * 0.2)
-    max_possible_score = (7 * (0.2 + 0.3 + 0.1 + 0.1 + 0.2 + 0.2 + 0.2))
+    max_possible_score = (len(fixtures) * (0.2 + 0.3 + 0.1 + 0.1 + 0.2 + 0.2 + 0.2))
     form_score = (total_weighted_score / max_possible_score) * 100
     
     return form_score
 
 # Function to calculate midfielder form
-def calculate_midfielder_form(player_id):
-    # Fetching last 7 fixtures data for the midfielder
-    fixtures = fetch_last_7_fixtures(player_id)
-    if not fixtures:
+@timed_stage("midfielder_form")
+def calculate_midfielder_form(player_id, history=None, window=WINDOW_SIZE):
+    # Fetching the last `window` fixtures data for the midfielder
+    fixtures = fetch_last_fixtures(player_id, history, window)
+    if len(fixtures) == 0:
         return 0  # No fixtures found, form score is 0
     
     # Initializing variables to store cumulative statistics
@@ -133,16 +113,17 @@ def calculate_midfielder_form(player_id):
     # Calculating form score
     # total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.1) + (bonus_points * 0.1) + (assists * 0.2) + (goals_scored * 0.3) + (opponent_goals_scored * 0.2) + (opponent_goals_conceded * 0.2)
     total_weighted_score = (minutes_played * 0.2) + (cleansheets_kept * 0.1) + (bonus_points * 0.1) + (assists * 0.2) + (goals_scored * 0.3)
-    max_possible_score = (7 * (0.2 + 0.1 + 0.1 + 0.2 + 0.3 + 0.2 + 0.2))
+    max_possible_score = (len(fixtures) * (0.2 + 0.1 + 0.1 + 0.2 + 0.3 + 0.2 + 0.2))
     form_score = (total_weighted_score / max_possible_score) * 100
     
     return form_score
 
 # Function to calculate forward form
-def calculate_forward_form(player_id):
-    # Fetching last 7 fixtures data for the forward
-    fixtures = fetch_last_7_fixtures(player_id)
-    if not fixtures:
+@timed_stage("forward_form")
+def calculate_forward_form(player_id, history=None, window=WINDOW_SIZE):
+    # Fetching the last `window` fixtures data for the forward
+    fixtures = fetch_last_fixtures(player_id, history, window)
+    if len(fixtures) == 0:
         return 0  # No fixtures found, form score is 0
     
     # Initializing variables to store cumulative statistics
@@ -163,7 +144,52 @@ def calculate_forward_form(player_id):
     # Calculating form score
     # total_weighted_score = (minutes_played * 0.2) + (bonus_points * 0.2) + (assists * 0.2) + (goals_scored * 0.4) + (opponent_goals_conceded * 0.2)
     total_weighted_score = (minutes_played * 0.2) + (bonus_points * 0.2) + (assists * 0.2) + (goals_scored * 0.4)
-    max_possible_score = (7 * (0.2 + 0.2 + 0.2 + 0.4 + 0.2))
+    max_possible_score = (len(fixtures) * (0.2 + 0.2 + 0.2 + 0.4 + 0.2))
     form_score = (total_weighted_score / max_possible_score) * 100
     
     return form_score
+
+# Stats behind each position's form score, weighted and added in the same order as the calculators above
+FORM_WEIGHTS = {
+    1: [('minutes', 0.2), ('clean_sheets', 0.3), ('bonus', 0.1), ('saves', 0.1), ('assists', 0)],
+    2: [('minutes', 0.2), ('clean_sheets', 0.3), ('bonus', 0.1), ('assists', 0.1), ('goals_scored', 0.2)],
+    3: [('minutes', 0.2), ('clean_sheets', 0.1), ('bonus', 0.1), ('assists', 0.2), ('goals_scored', 0.3)],
+    4: [('minutes', 0.2), ('bonus', 0.2), ('assists', 0.2), ('goals_scored', 0.4)],
+}
+
+# Weight totals each calculator's max_possible_score is built from
+FORM_MAX_WEIGHTS = {
+    1: (0.2 + 0.3 + 0.1 + 0.1 + 0),
+    2: (0.2 + 0.3 + 0.1 + 0.1 + 0.2 + 0.2 + 0.2),
+    3: (0.2 + 0.1 + 0.1 + 0.2 + 0.3 + 0.2 + 0.2),
+    4: (0.2 + 0.2 + 0.2 + 0.4 + 0.2),
+}
+
+# Function to calculate the position form of every player in one pass
+@timed_stage("form_table")
+def calculate_form_table(history, player_ids, element_types, window=WINDOW_SIZE):
+    element_types = np.asarray(element_types)
+    form = np.zeros(len(element_types))  # Players without fixtures keep a form score of 0
+
+    # Find each player's group in the history table
+    index = history.player_positions(player_ids)
+    found = index >= 0
+
+    # Stats summed over each player's last `window` fixtures, from the history table's rolling sums
+    names = ('minutes', 'clean_sheets', 'bonus', 'saves', 'assists', 'goals_scored')
+    if window == WINDOW_SIZE:
+        totals = {name: history.window_sums(name) for name in names}
+        games = history.window_counts()
+    else:
+        totals = {name: history.window_stats(name, last=window)[0] for name in names}
+        games = history.window_stats('games', last=window)[1]
+    for element_type, weights in FORM_WEIGHTS.items():
+        mask = found & (element_types == element_type)
+        rows = index[mask]
+        total_weighted_score = 0.0
+        for name, weight in weights:
+            total_weighted_score = total_weighted_score + (totals[name][rows] * weight)
+        # Players who have played fewer fixtures than the window are scored over the ones they played
+        max_possible_score = (games[rows] * FORM_MAX_WEIGHTS[element_type])
+        form[mask] = (total_weighted_score / max_possible_score) * 100
+    return form
@@ -0,0 +1,27 @@
+import unicodedata
+
+# Function to normalize a player name for lookups
+def normalize_name(name):
+    return unicodedata.normalize('NFKC', name).strip().casefold()
+
+# Class to look up players and clubs by id or name, built once per data snapshot
+class PlayerIndex:
+    def __init__(self, players_data, teams):
+        self.players_by_id = {}
+        self.ids_by_name = {}
+        for player_data in players_data:
+            self.players_by_id[player_data['id']] = player_data
+            self.ids_by_name.setdefault(normalize_name(player_data['web_name']), []).append(player_data['id'])
+        self.clubs_by_team = {team['id']: team['name'] for team in teams}
+
+    # Function to get a player by id
+    def get_player(self, player_id):
+        return self.players_by_id.get(player_id)
+
+    # Function to get every player with a web_name
+    def find_by_name(self, name):
+        return [self.players_by_id[player_id] for player_id in self.ids_by_name.get(normalize_name(name), [])]
+
+    # Function to get the club name of a team
+    def club_name(self, team_id):
+        return self.clubs_by_team.get(team_id, "Unknown Club")
@@ -1,193 +1,212 @@
-import os
 import json
-import requests
+import threading
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
 from urllib.parse import unquote
-from app.premier_selector import players_data
-
-DATA_DIR = "fpl_data"
-
-# Function to fetch data from the FPL API and save it to a file
-def fetch_and_save_data(endpoint, filename):
-    url = f"https://fantasy.premierleague.com/api/{endpoint}/"
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-    
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filepath = os.path.join(DATA_DIR, filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
-        existing_data.update(data)
-        data = existing_data
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
-
-# Function to load data from a file
-def load_data_from_file(filename):
-    try:
-        with open(os.path.join(DATA_DIR, filename), 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except (json.JSONDecodeError, FileNotFoundError):
-        return None
+from app.data_service import data_service
+from app.figure_cache import figure_cache, json_size
+from app.metrics import record_cache, time_stage, timed_stage
 
-# Function to fetch data, either from file or API
-def fetch_data(endpoint, filename):
-    fetch_and_save_data(endpoint, filename)
-    data = load_data_from_file(filename)
-    return data
+# Render figures of the top-ranked players in the background whenever the data changes
+PRERENDER_TOP_PLAYERS = True
 
 # Function to get season data for a player
+@timed_stage("load_player_stats")
 def load_player_stats(player_name):
     player_name = unquote(player_name)
-    player_id = next((int(player['id']) for player in players_data if player['web_name'] == player_name), None)
-    filename = f"player_{player_id}_fixtures.json"
-    data = fetch_data(f"element-summary/{player_id}", filename)
-    player_statistics = data['history'] if data else []
-
-    if player_statistics:
-        return generate_player_stats(player_statistics, player_name, player_id)
+    snapshot = data_service.get_snapshot()
+    if snapshot is None:
+        return html.Div("Player data is still loading, please try again shortly.")
+
+    # Show every player sharing the name rather than just the first match
+    matches = snapshot.index.find_by_name(player_name)
+    stats = []
+    for player_data in matches:
+        figure = player_figure(snapshot, player_data)
+        if figure is not None:
+            stats.append(generate_player_stats(figure, player_title(snapshot, player_data)))
+
+    if len(stats) == 1:
+        return stats[0]
+    elif stats:
+        return html.Div(stats)
     else:
         print(f"Player '{player_name}' data not found or error loading data.")
         return html.Div(f"No valid data found for player '{player_name}'.")
 
-def generate_player_stats(player_stats, player_name, player_id):
+# Function to get the title of a player, with their club when another player shares the name
+def player_title(snapshot, player_data):
+    if len(snapshot.index.find_by_name(player_data['web_name'])) > 1:
+        return f"{player_data['web_name']} ({snapshot.index.club_name(player_data['team'])})"
+    return player_data['web_name']
+
+# Function to get a player's figure as JSON, rendering it only once per data version
+def player_figure(snapshot, player_data):
+    figure = figure_cache.get(player_data['id'], snapshot.version)
+    record_cache("figure", figure is not None)
+    if figure is not None:
+        return figure
+
+    player_statistics = snapshot.history.player_rows(player_data['id'])
+    if not len(player_statistics):
+        return None
     try:
-        # Extract relevant stats
-        gameweeks = [entry['round'] for entry in player_stats]
-        points = [entry['total_points'] for entry in player_stats]
-        goals_scored = [entry['goals_scored'] for entry in player_stats]
-        assists = [entry['assists'] for entry in player_stats]
-        bonus_points = [entry['bonus'] for entry in player_stats]
-        clean_sheets = [entry['clean_sheets'] for entry in player_stats]
-
-        # Fetch player position
-        player_position = next((player['element_type'] for player in players_data if player['id'] == player_id), None)
-
-        # Customize visualization based on player position
-        if player_position == 1:  # Goalkeeper
-            # Customize visualization for goalkeeper
-            saves = [entry['saves'] for entry in player_stats]
-            penalties_saved = [entry['penalties_saved'] for entry in player_stats]
-
-            # Create traces for goalkeeper
-            saves_trace = go.Scatter(x=gameweeks, y=saves, mode='lines+markers', name='Saves', marker=dict(color='purple'), line=dict(shape='spline'))
-            penalties_saved_trace = go.Scatter(x=gameweeks, y=penalties_saved, mode='lines+markers', name='Penalties Saved', marker=dict(color='orange'), line=dict(shape='spline'))
-            clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
-            bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='green'), line=dict(shape='spline'))
-            points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='red'), line=dict(shape='spline'))
-
-            # Update layout
-            layout = go.Layout(
-                title=f"Performance of {player_name} (Goalkeeper) in the 2023/24 season",
-                xaxis=dict(title='Gameweeks'),
-                yaxis=dict(title='Stats'),
-                # legend=dict(orientation='h'),
-                plot_bgcolor='rgba(255, 228, 196, 0.9)',
-                paper_bgcolor='rgba(47, 79, 79, 0.3)',
-                margin=dict(l=40, r=40, t=50, b=40)
-            )
-
-            # Create figure
-            fig = go.Figure(data=[saves_trace, penalties_saved_trace, clean_sheets_trace, bonus_points_trace, points_trace], layout=layout)
-
-        elif player_position == 2:  # Defender
-            # Customize visualization for defender
-
-            # Create traces for defender
-            clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
-            assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
-            goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
-            bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
-            points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
-
-            # Update layout
-            layout = go.Layout(
-                title=f"Performance of {player_name} (Defender) in the 2023/24 season",
-                xaxis=dict(title='Gameweeks'),
-                yaxis=dict(title='Stats'),
-                # legend=dict(orientation='h'),
-                plot_bgcolor='rgba(255, 228, 196, 0.9)',
-                paper_bgcolor='rgba(47, 79, 79, 0.3)',
-                margin=dict(l=40, r=40, t=80, b=40)
-            )
-
-            # Create figure
-            fig = go.Figure(data=[clean_sheets_trace, assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
-
-        elif player_position == 3:  # Midfielder
-            # Customize visualization for midfielder
-
-            # Create traces for midfielder
-            clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
-            assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
-            goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
-            bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
-            points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
-
-            # Update layout
-            layout = go.Layout(
-                title=f"Performance of {player_name} (Midfielder) in the 2023/24 season",
-                xaxis=dict(title='Gameweeks'),
-                yaxis=dict(title='Stats'),
-                # legend=dict(orientation='h'),
-                plot_bgcolor='rgba(255, 228, 196, 0.9)',
-                paper_bgcolor='rgba(47, 79, 79, 0.3)',
-                margin=dict(l=40, r=40, t=80, b=40)
-            )
-
-            # Create figure
-            fig = go.Figure(data=[clean_sheets_trace, assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
-
-        elif player_position == 4:  # Forward
-            # Customize visualization for forward
-
-            # Create traces for forward
-            assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
-            goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
-            bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
-            points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
-
-            # Update layout
-            layout = go.Layout(
-                title=f"Performance of {player_name} (Forward) in the 2023/24 season",
-                xaxis=dict(title='Gameweeks'),
-                yaxis=dict(title='Stats'),
-                # legend=dict(orientation='h'),
-                plot_bgcolor='rgba(255, 228, 196, 0.9)',
-                paper_bgcolor='rgba(47, 79, 79, 0.3)',
-                margin=dict(l=40, r=40, t=80, b=40)
-            )
-
-            # Create figure
-            fig = go.Figure(data=[assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
-
-        graph_height = 400
-        card_body_min_height = graph_height + 50
-
-        # Return the plot as a centered dbc.Card component with interactive elements
-        return html.Div(
-            dbc.Card(
-                [
-                    dbc.CardHeader(html.H5(f"Performance of {player_name}", className="card-title")),
-                    dbc.CardBody(
-                        dbc.Row(
-                            dbc.Col(
-                                dcc.Graph(figure=fig, config={'displayModeBar': False}),
-                                style={"minHeight": f"{card_body_min_height}px"}
-                            ),
-                            className="mt-3 justify-content-center align-items-center"
+        fig = generate_player_figure(player_statistics, player_title(snapshot, player_data), player_data['element_type'])
+    except KeyError:
+        return None
+    with time_stage("figure_serialize"):
+        figure = json.loads(fig.to_json())
+    # Charge what the parsed figure holds in memory, several times the length of its JSON
+    figure_cache.put(player_data['id'], snapshot.version, figure, json_size(figure))
+    return figure
+
+# Function to render the figures of players ahead of their first view
+def prerender_figures(snapshot, players):
+    for player in players:
+        if not figure_cache.contains(player.id, snapshot.version):
+            player_data = snapshot.index.get_player(player.id)
+            if player_data is not None:
+                player_figure(snapshot, player_data)
+
+# Function to render the figures of players on a background thread
+def prerender_in_background(snapshot, players):
+    if PRERENDER_TOP_PLAYERS:
+        threading.Thread(target=prerender_figures, args=(snapshot, players), name="figure-prerender", daemon=True).start()
+
+# Function to build the figure of a player's season
+@timed_stage("generate_player_figure")
+def generate_player_figure(player_stats, player_name, player_position):
+    # Extract relevant stats
+    gameweeks = player_stats['round'].tolist()
+    points = player_stats['total_points'].tolist()
+    goals_scored = player_stats['goals_scored'].tolist()
+    assists = player_stats['assists'].tolist()
+    bonus_points = player_stats['bonus'].tolist()
+    clean_sheets = player_stats['clean_sheets'].tolist()
+
+    # Customize visualization based on player position
+    if player_position == 1:  # Goalkeeper
+        # Customize visualization for goalkeeper
+        saves = player_stats['saves'].tolist()
+        penalties_saved = player_stats['penalties_saved'].tolist()
+
+        # Create traces for goalkeeper
+        saves_trace = go.Scatter(x=gameweeks, y=saves, mode='lines+markers', name='Saves', marker=dict(color='purple'), line=dict(shape='spline'))
+        penalties_saved_trace = go.Scatter(x=gameweeks, y=penalties_saved, mode='lines+markers', name='Penalties Saved', marker=dict(color='orange'), line=dict(shape='spline'))
+        clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
+        bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='green'), line=dict(shape='spline'))
+        points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='red'), line=dict(shape='spline'))
+
+        # Update layout
+        layout = go.Layout(
+            title=f"Performance of {player_name} (Goalkeeper) in the 2023/24 season",
+            xaxis=dict(title='Gameweeks'),
+            yaxis=dict(title='Stats'),
+            # legend=dict(orientation='h'),
+            plot_bgcolor='rgba(255, 228, 196, 0.9)',
+            paper_bgcolor='rgba(47, 79, 79, 0.3)',
+            margin=dict(l=40, r=40, t=50, b=40)
+        )
+
+        # Create figure
+        fig = go.Figure(data=[saves_trace, penalties_saved_trace, clean_sheets_trace, bonus_points_trace, points_trace], layout=layout)
+
+    elif player_position == 2:  # Defender
+        # Customize visualization for defender
+
+        # Create traces for defender
+        clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
+        assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
+        goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
+        bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
+        points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
+
+        # Update layout
+        layout = go.Layout(
+            title=f"Performance of {player_name} (Defender) in the 2023/24 season",
+            xaxis=dict(title='Gameweeks'),
+            yaxis=dict(title='Stats'),
+            # legend=dict(orientation='h'),
+            plot_bgcolor='rgba(255, 228, 196, 0.9)',
+            paper_bgcolor='rgba(47, 79, 79, 0.3)',
+            margin=dict(l=40, r=40, t=80, b=40)
+        )
+
+        # Create figure
+        fig = go.Figure(data=[clean_sheets_trace, assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
+
+    elif player_position == 3:  # Midfielder
+        # Customize visualization for midfielder
+
+        # Create traces for midfielder
+        clean_sheets_trace = go.Scatter(x=gameweeks, y=clean_sheets, mode='lines+markers', name='Clean Sheets', marker=dict(color='blue'), line=dict(shape='spline'))
+        assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
+        goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
+        bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
+        points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
+
+        # Update layout
+        layout = go.Layout(
+            title=f"Performance of {player_name} (Midfielder) in the 2023/24 season",
+            xaxis=dict(title='Gameweeks'),
+            yaxis=dict(title='Stats'),
+            # legend=dict(orientation='h'),
+            plot_bgcolor='rgba(255, 228, 196, 0.9)',
+            paper_bgcolor='rgba(47, 79, 79, 0.3)',
+            margin=dict(l=40, r=40, t=80, b=40)
+        )
+
+        # Create figure
+        fig = go.Figure(data=[clean_sheets_trace, assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
+
+    elif player_position == 4:  # Forward
+        # Customize visualization for forward
+
+        # Create traces for forward
+        assists_trace = go.Scatter(x=gameweeks, y=assists, mode='lines+markers', name='Assists', marker=dict(color='green'), line=dict(shape='spline'))
+        goals_scored_trace = go.Scatter(x=gameweeks, y=goals_scored, mode='lines+markers', name='Goals Scored', marker=dict(color='red'), line=dict(shape='spline'))
+        bonus_points_trace = go.Scatter(x=gameweeks, y=bonus_points, mode='lines+markers', name='Bonus Points', marker=dict(color='purple'), line=dict(shape='spline'))
+        points_trace = go.Scatter(x=gameweeks, y=points, mode='lines+markers', name='GW Points', marker=dict(color='orange'), line=dict(shape='spline'))
+
+        # Update layout
+        layout = go.Layout(
+            title=f"Performance of {player_name} (Forward) in the 2023/24 season",
+            xaxis=dict(title='Gameweeks'),
+            yaxis=dict(title='Stats'),
+            # legend=dict(orientation='h'),
+            plot_bgcolor='rgba(255, 228, 196, 0.9)',
+            paper_bgcolor='rgba(47, 79, 79, 0.3)',
+            margin=dict(l=40, r=40, t=80, b=40)
+        )
+
+        # Create figure
+        fig = go.Figure(data=[assists_trace, goals_scored_trace, bonus_points_trace, points_trace], layout=layout)
+
+    return fig
+
+# Function to show a player's figure in a card
+def generate_player_stats(figure, player_name):
+    graph_height = 400
+    card_body_min_height = graph_height + 50
+
+    # Return the plot as a centered dbc.Card component with interactive elements
+    return html.Div(
+        dbc.Card(
+            [
+                dbc.CardHeader(html.H5(f"Performance of {player_name}", className="card-title")),
+                dbc.CardBody(
+                    dbc.Row(
+                        dbc.Col(
+                            dcc.Graph(figure=figure, config={'displayModeBar': False}),
+                            style={"minHeight": f"{card_body_min_height}px"}
                         ),
+                        className="mt-3 justify-content-center align-items-center"
                     ),
-                ],
-                className="shadow-sm bg-white rounded",
-                style={"width": "80%"}
-            ),
-            className="d-flex justify-content-center align-items-center vh-70"
-        )
-    except KeyError:
-        return html.Div(f"No valid data found for player '{player_name}'.")
\ No newline at end of file
+                ),
+            ],
+            className="shadow-sm bg-white rounded",
+            style={"width": "80%"}
+        ),
+        className="d-flex justify-content-center align-items-center vh-70"
+    )
\ No newline at end of file
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+# Labels of the element_type codes
+POSITION_LABELS = {1: "Goalkeeper", 2: "Defender", 3: "Midfielder", 4: "Forward"}
+
+# Function to label each position
+def label_position(position_id):
+    return POSITION_LABELS.get(position_id, "Unknown Position")
+
+# Class to view one row of a player table, with the attributes the Player objects used to have
+class Player:
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def id(self):
+        return int(self.table.ids[self.row])
+
+    @property
+    def name(self):
+        return self.table.names[self.table.name_ids[self.row]]
+
+    @property
+    def position_id(self):
+        return int(self.table.position_ids[self.row])
+
+    @property
+    def element_type(self):
+        return label_position(self.position_id)
+
+    @property
+    def team(self):
+        return int(self.table.team_ids[self.row])
+
+    @property
+    def club(self):
+        return self.table.club_name(self.team)
+
+    @property
+    def form(self):
+        return float(self.table.forms[self.row])
+
+    @property
+    def predicted(self):
+        return float(self.table.predicted[self.row])  # Predicted points of the next fixture
+
+    @property
+    def points(self):
+        return int(self.table.points[self.row])
+
+    @property
+    def value(self):
+        return int(self.table.values[self.row])
+
+    def __eq__(self, other):
+        return isinstance(other, Player) and other.table is self.table and other.row == self.row
+
+    def __hash__(self):
+        return hash((id(self.table), self.row))
+
+    def __repr__(self):
+        return f"Player({self.id}, {self.name!r})"
+
+# Class to hold every player of a snapshot as NumPy columns, with each name stored once
+class PlayerTable:
+    def __init__(self, ids, position_ids, team_ids, forms, predicted, points, values, name_ids, names, club_names, position_forms=None):
+        self.ids = ids
+        self.position_ids = position_ids
+        self.team_ids = team_ids
+        self.forms = forms
+        self.predicted = predicted
+        self.points = points
+        self.values = values
+        self.name_ids = name_ids
+        self.names = names
+        self.club_names = club_names
+        self.position_forms = position_forms
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (Player(self, row) for row in range(len(self.ids)))
+
+    def __getitem__(self, row):
+        return Player(self, row)
+
+    # Function to get a table sharing every column except form, for ranking by form over another window
+    def with_forms(self, forms):
+        return PlayerTable(
+            self.ids, self.position_ids, self.team_ids, forms, self.predicted, self.points, self.values,
+            self.name_ids, self.names, self.club_names, self.position_forms,
+        )
+
+    # Function to get the views of a list of rows
+    def rows(self, rows):
+        return [Player(self, int(row)) for row in rows]
+
+    # Function to get the club name of a team
+    def club_name(self, team_id):
+        return self.club_names.get(team_id, "Unknown Club")
+
+    # Function to get every player's name, in row order
+    def name_column(self):
+        return np.asarray(self.names, dtype=object)[self.name_ids]
+
+    # Function to get every player's club name, in row order
+    def club_column(self):
+        return np.array([self.club_name(team_id) for team_id in self.team_ids.tolist()], dtype=object)
+
+    # Function to get the rows of the players of a club
+    def club_mask(self, club):
+        team_ids = [team_id for team_id, name in self.club_names.items() if name == club]
+        return np.isin(self.team_ids, team_ids)
+
+    # Function to get the best k of some rows by a score column, keeping the row order between equal scores.
+    # A partial selection finds the k-th best score, so only the rows at or above it are sorted.
+    def top(self, rows, scores, k):
+        values = scores[rows]
+        candidates = np.arange(len(values))
+        if 0 < k < len(values):
+            # Partitioning the negated scores leaves players without a score at the bottom, as the sort does
+            threshold = -np.partition(-values, k - 1)[k - 1]
+            if not np.isnan(threshold):
+                # Rows tied with the k-th best are all kept, and the stable sort takes them in row order up to k
+                candidates = np.flatnonzero(values >= threshold)
+        order = candidates[np.argsort(-values[candidates], kind='stable')[:k]]
+        return self.rows(rows[order])
+
+    # Function to build the player frame from the columns
+    def to_frame(self):
+        frame = pd.DataFrame({
+            'id': self.ids,
+            'web_name': self.name_column(),
+            'element_type': self.position_ids,
+            'team': self.team_ids,
+            'total_points': self.points,
+            'now_cost': self.values,
+            'form_score': self.forms,
+            'predicted_form': self.predicted,
+        })
+        if self.position_forms is not None:
+            frame['position_form'] = self.position_forms
+        return frame
+
+# Function to give every distinct name one code, so each name is stored once however many players share it
+def intern_names(names):
+    codes = {}
+    name_ids = np.fromiter((codes.setdefault(name, len(codes)) for name in names), dtype=np.int32, count=len(names))
+    return name_ids, list(codes)
+
+# Function to build the player table from each player's data and derived metrics
+def build_player_table(players_data, metrics, club_names):
+    count = len(players_data)
+
+    def column(values, dtype):
+        return np.fromiter(values, dtype=dtype, count=count)
+
+    player_metrics = [metrics[player_data['id']] for player_data in players_data]
+    name_ids, names = intern_names([player_data['web_name'] for player_data in players_data])
+    return PlayerTable(
+        ids=column((player_data['id'] for player_data in players_data), np.int32),
+        position_ids=column((player_data['element_type'] for player_data in players_data), np.int8),
+        team_ids=column((player_data['team'] for player_data in players_data), np.int16),
+        forms=column((values['form_score'] for values in player_metrics), np.float64),
+        predicted=column((values['predicted_form'] for values in player_metrics), np.float64),
+        points=column((player_data['total_points'] for player_data in players_data), np.int32),
+        values=column((player_data['now_cost'] for player_data in players_data), np.int16),
+        name_ids=name_ids,
+        names=names,
+        club_names=club_names,
+        position_forms=column((values['position_form'] for values in player_metrics), np.float64),
+    )
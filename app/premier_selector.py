@@ -1,168 +1,248 @@
-import os
-import json
-import requests
-import pandas as pd
-from datetime import datetime
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from app.player_form_calculator import fetch_last_7_fixtures, DATA_DIR
-
-# Function to fetch data from the FPL API and save it to a file
-def fetch_and_save_data(endpoint, filename):
-    url = f"https://fantasy.premierleague.com/api/{endpoint}/"
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    data = response.json()
-    
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filepath = os.path.join(DATA_DIR, filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
-        if 'last_updated' in existing_data and 'last_updated' in data:
-            existing_last_updated = datetime.fromtimestamp(existing_data['last_updated'])
-            new_last_updated = datetime.fromtimestamp(data['last_updated'])
-            if existing_last_updated >= new_last_updated:
-                 return existing_data
-        existing_data.update(data)
-        data = existing_data
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
-    return data
-
-# Function to load data from a file
-def load_data_from_file(filepath):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)  # Parse JSON data
-        return data
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        raise IOError(f"Error loading data from {filepath}: {e}")
+import hashlib
+import numpy as np
+from app.fixture_matrix import FIXTURE_WEEKS, get_fixture_matrix
+from app.fpl_cache import fpl_cache
+from app.form_model import load_form_model, next_fixtures, predict_form
+from app.history_loader import load_histories, update_histories
+from app.history_store import SEASON_FIXTURES, WINDOW_SIZE
+from app.metrics import CACHE_REQUESTS, time_stage, timed_stage
+from app.player_form_calculator import calculate_form_table
+from app.player_index import PlayerIndex
+from app.player_table import build_player_table
+from app.ranking import RankingService
 
 # Function to fetch player data from FPL API
+@timed_stage("fetch_player_data")
 def fetch_player_data():
-    filename = "player_data.json"
-    filepath = os.path.join(DATA_DIR, filename)
-    if os.path.exists(filepath):
-        data = load_data_from_file(filepath)
-        if data is not None:
-            return data
-    
-    # If file doesn't exist or loading from file fails, fetch data from API
     try:
-        data = fetch_and_save_data("bootstrap-static", filename)
-        return data
+        return fpl_cache.get("bootstrap-static", "player_data.json")
     except IOError as e:
         print(f"Error fetching player data: {e}")
         return None
 
 # Function to fetch team data from FPL API
+@timed_stage("fetch_team_data")
 def fetch_team_data():
-    filename = "team_data.json"
-    filepath = os.path.join(DATA_DIR, filename)
-    if os.path.exists(filepath):
-        data = load_data_from_file(filepath)
-        if data is not None:
-            return data
     try:
-        data = fetch_and_save_data("fixtures", filename)
-        return data
+        return fpl_cache.get("fixtures", "team_data.json")
     except IOError as e:
         print(f"Error fetching team data: {e}")
         return None
 
-# Function to fetch club name based on team ID
-def fetch_club_name(team_id, teams):
-    for team in teams:
-        if team['id'] == team_id:
-            return team['name']
-    return "Unknown Club"
-
-# Function to calculate form score
-def calculate_form_score(player_id):
-    fixtures = fetch_last_7_fixtures(player_id)
-    # Calculate form score based on fixtures
-    return sum(fixture['total_points'] for fixture in fixtures) / 7
-
-# Fetch player data from FPL API
-data = fetch_player_data()
-
-# Convert JSON to DataFrame
-players_data = data.get('elements', [])  # Use get() to handle missing keys
-
-# Fetch team data
-teams = data.get('teams', [])
-team_data = fetch_team_data()
-
-# Create DataFrame for training the model
-df = pd.DataFrame(players_data)
-
-# Calculate form score for each player
-df['form_score'] = df['id'].apply(calculate_form_score)
-
-# Define features and target variable
-X = df[['form_score']]
-y = df['form_score']
-
-# Split data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Initialize and train RandomForestRegressor model
-model = RandomForestRegressor()
-model.fit(X_train, y_train)
-
-# Function to predict player form using the trained model
-def predict_player_form(player_data, model):
-    features = [[player_data['form_score']]]
-    return model.predict(features)[0]
-
-# Sample Player class to hold player data and form score
-class Player:
-    def __init__(self, id, name, element_type, form, points, club, value):
-        self.id = id
-        self.name = name
-        self.element_type = label_position(element_type)
-        self.form = form
-        self.points = points
-        self.club = club
-        self.value = value
-
-# Function to label each position
-def label_position(position_id):
-    if position_id == 1:
-        return "Goalkeeper"
-    elif position_id == 2:
-        return "Defender"
-    elif position_id == 3:
-        return "Midfielder"
-    elif position_id == 4:
-        return "Forward"
-    else:
-        return "Unknown Position"
-
-# Create list of Player objects
-players = []
-for player_data in players_data:
-    player_id = player_data['id']
-    player_name = player_data['web_name']
-    element_type = player_data['element_type']
-    form = calculate_form_score(player_id)
-    points = player_data['total_points']
-    club = fetch_club_name(player_data['team'], teams)
-    value = player_data['now_cost']
-    player = Player(player_id, player_name, element_type, form, points, club, value)
-    players.append(player)
-
-# Function to select players for each position based on form
-def select_players(position_id, num_players, players):
-    position_players = [player for player in players if player.element_type == label_position(position_id)]
-    position_players.sort(key=lambda x: x.form, reverse=True)
-    position_players = position_players[:num_players]
-    return position_players
-
-# Select players for each position
-goalkeepers = select_players(1, 10, players)
-defenders = select_players(2, 12, players)
-midfielders = select_players(3, 12, players)
-forwards = select_players(4, 10, players)
+# Number of players listed for each position
+SELECTION_SIZES = ((1, 10), (2, 12), (3, 12), (4, 10))
 
+# Function to calculate the form score of each player
+def calculate_form_scores(history, player_ids, window=WINDOW_SIZE):
+    # Average points over the last `window` fixtures, or over every fixture for players who have played fewer
+    if window == WINDOW_SIZE:
+        totals, games = history.window_sums('total_points'), history.window_counts()
+    else:
+        totals, games = history.window_stats('total_points', last=window)
+    positions = history.player_positions(player_ids)
+    found = positions >= 0
+    positions = np.maximum(positions, 0)  # Players without history are masked out by found
+    if not len(totals):
+        return np.zeros(len(positions))
+    return np.where(found & (games[positions] > 0), totals[positions] / np.maximum(games[positions], 1), 0.0)
+
+# Derived metrics from the last build, keyed by player id. Only one build runs at a time, so it is never updated concurrently.
+_player_metrics = {}
+
+# Function to fingerprint a player's data, history, next fixture and model, so unchanged players can be skipped
+def player_data_key(player_data, history, upcoming, model):
+    rows = history.player_rows(player_data['id'])
+    digest = hashlib.blake2b(rows.tobytes(), digest_size=16).digest()
+    trained_at = model['trained_at'] if model else None
+    return (digest, player_data['element_type'], player_data['team'], player_data['now_cost'], upcoming.get(player_data['team']), trained_at)
+
+# Function to compute every player's derived metrics exactly once per data version.
+# When the ids of the changed players are known, everyone else reuses their metrics unchecked.
+@timed_stage("player_metrics")
+def compute_player_metrics(players_data, index, history, changed_ids=None, model=None, upcoming=None):
+    upcoming = upcoming or {}
+    metrics = {}
+    changed = []
+    for player_data in players_data:
+        cached = _player_metrics.get(player_data['id'])
+        if cached is not None and changed_ids is not None and player_data['id'] not in changed_ids:
+            metrics[player_data['id']] = cached[1]
+            continue
+        key = player_data_key(player_data, history, upcoming, model)
+        if cached is not None and cached[0] == key:
+            metrics[player_data['id']] = cached[1]
+        else:
+            changed.append((player_data, key))
+
+    if changed:
+        # Calculate position weighted form for every changed player at once
+        position_form = calculate_form_table(
+            history,
+            [player_data['id'] for player_data, _ in changed],
+            [player_data['element_type'] for player_data, _ in changed],
+        )
+        # Score every changed player with one call to the model
+        if model is not None:
+            with time_stage("predict_form"):
+                predictions = predict_form(model, history, [player_data for player_data, _ in changed], upcoming)
+        else:
+            predictions = [None] * len(changed)
+        form_scores = calculate_form_scores(history, [player_data['id'] for player_data, _ in changed])
+        for (player_data, key), player_position_form, prediction, form_score in zip(changed, position_form, predictions, form_scores):
+            form_score = float(form_score)
+            player_metrics = {
+                'form_score': form_score,
+                'position_form': float(player_position_form),
+                'predicted_form': form_score if prediction is None else float(prediction),
+            }
+            _player_metrics[player_data['id']] = (key, player_metrics)
+            metrics[player_data['id']] = player_metrics
+
+    # Players no longer listed, such as those who left the league, are dropped so the cache only holds current players
+    for player_id in _player_metrics.keys() - metrics.keys():
+        del _player_metrics[player_id]
+
+    CACHE_REQUESTS.inc(len(metrics) - len(changed), cache="player_metrics", result="hit")
+    CACHE_REQUESTS.inc(len(changed), cache="player_metrics", result="miss")
+    return metrics
+
+# Function to build the player table and frame from one set of metrics
+def build_players(players_data, index, history, changed_ids=None, model=None, upcoming=None):
+    metrics = compute_player_metrics(players_data, index, history, changed_ids, model, upcoming)
+
+    # Gather every player's data and metrics into columns, and build the frame from them in one go
+    with time_stage("build_player_table"):
+        players = build_player_table(players_data, metrics, index.clubs_by_team)
+    with time_stage("build_dataframe"):
+        df = players.to_frame()
+    return df, players
+
+# Function to select players for each position based on form, optionally weighted by their upcoming fixtures
+def select_players(position_id, num_players, players, fixture_matrix=None, fixture_weeks=FIXTURE_WEEKS):
+    rows = np.flatnonzero(players.position_ids == position_id)
+    scores = players.forms
+    if fixture_matrix is not None:
+        scores = scores * fixture_matrix.fixture_weights(players.team_ids, fixture_weeks)
+    return players.top(rows, scores, num_players)
+
+# Class to hold everything built from one load of the FPL data
+class Snapshot:
+    def __init__(self, data, players_data, teams, index, team_data, upcoming, history, df, model, players):
+        self.data = data
+        self.players_data = players_data
+        self.teams = teams
+        self.index = index
+        self.team_data = team_data
+        self.upcoming = upcoming
+        self.history = history
+        self.df = df
+        self.model = model
+        self.players = players
+        self.version = None
+
+        # Rankings by form over other windows than WINDOW_SIZE, built when first asked for
+        self.window_rankings = {}
+
+        # Built once per fixtures payload and shared by every snapshot until the feed changes
+        self.fixture_matrix = get_fixture_matrix(team_data)
+
+        with time_stage("rank_players"):
+            self.rank(players)
+
+    # Function to rank the players; ranking the whole table is cheap enough to redo for every snapshot
+    def rank(self, players):
+        self.ranking = RankingService(players, self.fixture_matrix)
+
+        # Select players for each position
+        self.goalkeepers, self.defenders, self.midfielders, self.forwards = self.select(self.ranking)
+
+    # Function to select the players listed for each position from a ranking
+    def select(self, ranking):
+        return tuple(ranking.top_k(position_id, num_players) for position_id, num_players in SELECTION_SIZES)
+
+    # Function to rank the players by their form over their last `window` fixtures.
+    # The sums come from the history table's running totals, so no history is scanned again.
+    # Longer windows than a season all give the same form, so at most one ranking per window up to a season is kept.
+    def ranking_for(self, window=WINDOW_SIZE):
+        window = max(1, min(window, SEASON_FIXTURES))
+        if window == WINDOW_SIZE:
+            return self.ranking
+        ranking = self.window_rankings.get(window)
+        if ranking is None:
+            forms = calculate_form_scores(self.history, self.players.ids, window)
+            ranking = self.window_rankings[window] = RankingService(self.players.with_forms(forms), self.fixture_matrix)
+        return ranking
+
+    # Function to get the players listed for each position, by their form over their last `window` fixtures
+    def selection(self, window=WINDOW_SIZE):
+        if window == WINDOW_SIZE:
+            return self.goalkeepers, self.defenders, self.midfielders, self.forwards
+        return self.select(self.ranking_for(window))
+
+# Function to fetch the FPL data and build a new snapshot from it
+@timed_stage("build_snapshot")
+def build_snapshot():
+    # Fetch player data from FPL API
+    data = fetch_player_data()
+    if data is None:
+        raise IOError("Player data is not available")
+
+    # Convert JSON to DataFrame
+    players_data = data.get('elements', [])  # Use get() to handle missing keys
+
+    # Fetch team data
+    teams = data.get('teams', [])
+    team_data = fetch_team_data()
+
+    # Load the fixture history of every player in one go
+    with time_stage("load_histories"):
+        history = load_histories([player_data['id'] for player_data in players_data], data.get('events', []))
+
+    # Index players and clubs once for every lookup made against this snapshot
+    with time_stage("build_index"):
+        index = PlayerIndex(players_data, teams)
+
+    # Load the model trained offline by app.form_model; players keep their form score without one
+    model = load_form_model()
+    upcoming = next_fixtures(team_data or [])
+    df, players = build_players(players_data, index, history, model=model, upcoming=upcoming)
+
+    return Snapshot(data, players_data, teams, index, team_data, upcoming, history, df, model, players)
+
+# Fields of a player's data that the player table or its metrics depend on
+PLAYER_FIELDS = ('web_name', 'element_type', 'team', 'total_points', 'now_cost')
+
+# Function to update a snapshot with only what changed since it was built
+@timed_stage("update_snapshot")
+def update_snapshot(previous):
+    # Revalidate the feeds now rather than waiting for their cache TTLs
+    data = fpl_cache.refresh("bootstrap-static", "player_data.json")
+    team_data = fpl_cache.refresh("fixtures", "team_data.json")
+    players_data = data.get('elements', [])
+    teams = data.get('teams', [])
+
+    # Append rows for gameweeks finished since the last update
+    with time_stage("update_histories"):
+        history, changed_ids = update_histories(previous.history, data.get('events', []), players_data, team_data)
+
+    # Pick up a newly trained model, and rescore everyone when there is one
+    model = load_form_model()
+    upcoming = next_fixtures(team_data or [])
+    if teams != previous.teams or model is not previous.model:
+        changed_ids = {player_data['id'] for player_data in players_data}
+
+    # Add players whose own data changed, such as a price change or a new signing, or whose next fixture changed
+    changed_teams = {team_id for team_id in upcoming.keys() | previous.upcoming.keys() if upcoming.get(team_id) != previous.upcoming.get(team_id)}
+    for player_data in players_data:
+        old_player_data = previous.index.get_player(player_data['id'])
+        if player_data['team'] in changed_teams or old_player_data is None or any(old_player_data.get(field) != player_data.get(field) for field in PLAYER_FIELDS):
+            changed_ids.add(player_data['id'])
+    removed_ids = set(previous.index.players_by_id) - {player_data['id'] for player_data in players_data}
+
+    if not changed_ids and not removed_ids:
+        return previous
+
+    index = PlayerIndex(players_data, teams)
+    df, players = build_players(players_data, index, history, changed_ids, model, upcoming)
+
+    return Snapshot(data, players_data, teams, index, team_data, upcoming, history, df, model, players)
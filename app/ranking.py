@@ -0,0 +1,59 @@
+import numpy as np
+
+# Function to get every player's points per million of cost
+def value_per_cost(players):
+    cost = players.values / 10
+    return np.divide(players.points, cost, out=np.zeros(len(cost)), where=cost > 0)
+
+# Metrics players can be ranked by, as a column of the player table
+RANKING_METRICS = {
+    'form': lambda players: players.forms,
+    'predicted': lambda players: players.predicted,
+    'total_points': lambda players: players.points,
+    'value_per_cost': value_per_cost,
+}
+
+# Class to answer top-k ranking queries over a player table bucketed by position
+class RankingService:
+    def __init__(self, players, fixture_matrix=None):
+        self.players = players
+        self.fixture_matrix = fixture_matrix
+        self.buckets = {int(position_id): np.flatnonzero(players.position_ids == position_id) for position_id in np.unique(players.position_ids)}
+        self.scores = {}
+
+    # Function to get the scores of every player by a metric, computed once per table
+    def metric_scores(self, metric):
+        scores = self.scores.get(metric)
+        if scores is None:
+            scores = self.scores[metric] = np.asarray(RANKING_METRICS[metric](self.players), dtype=float)
+        return scores
+
+    # Function to get the scores of every player by a metric, weighted by the fixtures of the next few gameweeks
+    def weighted_scores(self, metric, fixture_weeks):
+        key = (metric, fixture_weeks)
+        scores = self.scores.get(key)
+        if scores is None:
+            weights = self.fixture_matrix.fixture_weights(self.players.team_ids, fixture_weeks)
+            scores = self.scores[key] = self.metric_scores(metric) * weights
+        return scores
+
+    # Function to get the best k players of a position, optionally filtered by price (in £m) and club,
+    # and optionally weighted by the difficulty of their next fixture_weeks gameweeks
+    def top_k(self, position_id, k, max_price=None, club=None, metric='form', fixture_weeks=None):
+        if metric not in RANKING_METRICS:
+            raise ValueError(f"Unknown ranking metric '{metric}'")
+
+        rows = self.buckets.get(position_id, np.empty(0, dtype=np.intp))
+        if max_price is not None:
+            max_cost = round(max_price * 10)
+            rows = rows[self.players.values[rows] <= max_cost]
+        if club is not None:
+            rows = rows[self.players.club_mask(club)[rows]]
+
+        if fixture_weeks and self.fixture_matrix is not None:
+            scores = self.weighted_scores(metric, fixture_weeks)
+        else:
+            scores = self.metric_scores(metric)
+
+        # Ties keep the table order, as the sorted lists of Player objects did
+        return self.players.top(rows, scores, k)
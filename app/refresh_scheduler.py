@@ -0,0 +1,107 @@
+import time
+import threading
+from datetime import datetime
+
+# Seconds between refreshes while matches are being played
+LIVE_INTERVAL = 60
+
+# Seconds between refreshes in the run-up to a gameweek deadline, when prices and teams change most
+DEADLINE_INTERVAL = 2 * 60
+DEADLINE_WINDOW = 2 * 60 * 60
+
+# Seconds between refreshes once a gameweek has finished but its data is not yet checked
+PENDING_INTERVAL = 5 * 60
+
+# Seconds between refreshes when nothing is happening
+IDLE_INTERVAL = 6 * 60 * 60
+
+# Seconds to wait before retrying a refresh that failed
+ERROR_INTERVAL = 60
+
+# Seconds a match is treated as live after kick-off, unless it is marked finished sooner
+MATCH_LENGTH = 2 * 60 * 60
+
+# Function to read an FPL timestamp such as 2024-03-08T17:30:00Z as seconds since the epoch
+def parse_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+# Function to work out how long to wait before the next refresh, from gameweek deadlines and fixture kick-offs
+def next_refresh_delay(events, fixtures, now=None):
+    now = time.time() if now is None else now
+    upcoming = []
+
+    for fixture in fixtures or []:
+        kickoff = parse_time(fixture.get('kickoff_time'))
+        if kickoff is None or fixture.get('finished') or fixture.get('finished_provisional'):
+            continue
+        if kickoff <= now < kickoff + MATCH_LENGTH:
+            return LIVE_INTERVAL
+        if kickoff > now:
+            upcoming.append(kickoff)
+
+    for event in events or []:
+        if event.get('finished'):
+            if not event.get('data_checked'):
+                return PENDING_INTERVAL
+            continue
+        deadline = parse_time(event.get('deadline_time'))
+        if deadline is None:
+            continue
+        if deadline - DEADLINE_WINDOW <= now < deadline:
+            return DEADLINE_INTERVAL
+        if deadline > now:
+            upcoming.append(deadline - DEADLINE_WINDOW)
+
+    # Sleep until the next busy period starts, but never longer than the idle interval
+    delay = IDLE_INTERVAL
+    if upcoming:
+        delay = min(delay, min(upcoming) - now)
+    return max(delay, LIVE_INTERVAL)
+
+# Function to get the refresh delay for a snapshot
+def snapshot_refresh_delay(snapshot, now=None):
+    return next_refresh_delay(snapshot.data.get('events', []), snapshot.team_data, now)
+
+# Class to refresh a data service in the background, more often around deadlines and live matches
+class RefreshScheduler:
+    def __init__(self, service):
+        self.service = service
+        self.thread = None
+        self.stopped = threading.Event()
+        self.next_refresh_at = None
+        self.lock = threading.Lock()
+
+    # Function to start the scheduler thread, if it is not already running
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopped.clear()
+                self.thread = threading.Thread(target=self.run, name="data-refresh", daemon=True)
+                self.thread.start()
+            return self.thread
+
+    # Function to check whether the scheduler thread is running
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.stopped.is_set()
+
+    # Function to stop the scheduler after its current refresh
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        # The first snapshot is built by the warm-up, so start from whatever it produced
+        snapshot = self.service.wait_for_snapshot()
+        while not self.stopped.is_set():
+            delay = snapshot_refresh_delay(snapshot) if snapshot is not None else ERROR_INTERVAL
+            self.next_refresh_at = time.time() + delay
+            if self.stopped.wait(delay):
+                break
+
+            # The service builds the new snapshot off to the side and swaps it in, so requests keep being served
+            refreshed = self.service.refresh()
+            if refreshed is None:
+                snapshot = None  # Retry soon after a failed refresh
+            else:
+                snapshot = refreshed
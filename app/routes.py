@@ -1,6 +1,33 @@
 from app import app, dash_app
 from datetime import datetime
-from flask import request, render_template, send_from_directory
+import time
+from flask import g, request, render_template, send_from_directory, Response
+from app.data_service import data_service
+from app.squad_optimizer import optimize_squad
+from app.figure_cache import VersionedLRU, figure_cache, json_size
+from app.metrics import CALLBACK_SECONDS, FIGURE_CACHE_BYTES, SNAPSHOT_VERSION, record_cache, render_metrics
+
+# Memory cap of the cached squads. Their players are views of the snapshot's table, so each squad holds little.
+SQUAD_CACHE_BYTES = 1024 * 1024
+
+# Picked squads keyed by (locked and excluded ids, data version)
+squad_cache = VersionedLRU(SQUAD_CACHE_BYTES)
+
+
+# Start building the data snapshot in the background once the server takes requests
+@app.before_request
+def warm_up_data():
+    data_service.start_warmup()
+    g.request_started = time.perf_counter()
+
+
+# Record the latency of every Dash callback, named by the outputs it updates
+@app.after_request
+def record_callback_latency(response):
+    if request.path.endswith('/_dash-update-component') and 'request_started' in g:
+        body = request.get_json(silent=True) or {}
+        CALLBACK_SECONDS.observe(time.perf_counter() - g.request_started, callback=body.get('output', 'unknown'))
+    return response
 
 
 @app.route('/')
@@ -16,3 +43,52 @@ def index():
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory('static/images','favicon.ico')
+
+
+# Function to read a comma separated list of player ids from the query string
+def parse_player_ids(value):
+    return [int(player_id) for player_id in value.split(',') if player_id.strip().isdigit()]
+
+
+# Function to pick the best squad of a snapshot, solving once per data version and set of locked and excluded players
+def pick_squad(snapshot, locked_ids=(), excluded_ids=()):
+    key = (tuple(sorted(set(locked_ids))), tuple(sorted(set(excluded_ids))))
+    squad = squad_cache.get(key, snapshot.version)
+    record_cache("squad", squad is not None)
+    if squad is None:
+        squad = optimize_squad(snapshot.players, locked_ids=key[0], excluded_ids=key[1])
+        squad_cache.put(key, snapshot.version, squad, json_size(vars(squad)))
+    return squad
+
+
+@app.route('/team-of-the-week')
+def team_of_the_week():
+    current_time = datetime.now().strftime('%H:%M')
+    current_date = datetime.now().strftime('%d-%m')
+    current_year = datetime.now().strftime('%Y')
+
+    squad = None
+    message = None
+    snapshot = data_service.get_snapshot()
+    if snapshot is None:
+        message = "Player data is still loading, please try again shortly."
+    else:
+        try:
+            squad = pick_squad(
+                snapshot,
+                locked_ids=parse_player_ids(request.args.get('lock', '')),
+                excluded_ids=parse_player_ids(request.args.get('exclude', '')),
+            )
+        except ValueError as e:
+            message = str(e)
+    return render_template('team_of_the_week.html', squad=squad, message=message, now=current_time, today=current_date, year=current_year)
+
+
+# Expose the pipeline, callback, cache and upstream metrics in the Prometheus text format
+@app.route('/metrics')
+def metrics():
+    snapshot = data_service.get_snapshot()
+    if snapshot is not None:
+        SNAPSHOT_VERSION.set(snapshot.version)
+    FIGURE_CACHE_BYTES.set(figure_cache.size)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
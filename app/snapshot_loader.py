@@ -0,0 +1,26 @@
+import sys
+import time
+from app.data_service import DataService
+from app.premier_selector import build_snapshot, update_snapshot
+from app.refresh_scheduler import ERROR_INTERVAL, snapshot_refresh_delay
+from app.snapshot_store import SNAPSHOT_DIR, publish_snapshot, read_current_version
+
+# Function to build snapshots in this process and publish each new version for the web workers
+def run_loader(snapshot_dir=SNAPSHOT_DIR):
+    service = DataService(build_snapshot, update_snapshot)
+
+    # Carry on from the last published version, so workers always see the number move
+    service.version = read_current_version(snapshot_dir) or 0
+    published_version = None
+    while True:
+        snapshot = service.refresh()
+        if snapshot is not None and snapshot.version != published_version:
+            publish_snapshot(snapshot, snapshot_dir)
+            published_version = snapshot.version
+            print(f"Published snapshot v{snapshot.version} to {snapshot_dir}")
+
+        # Refresh often around deadlines and live matches, and rarely otherwise
+        time.sleep(snapshot_refresh_delay(snapshot) if snapshot is not None else ERROR_INTERVAL)
+
+if __name__ == '__main__':
+    run_loader(*sys.argv[1:2])
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import shutil
+import threading
+import numpy as np
+from app.history_store import HistoryTable
+from app.player_index import PlayerIndex
+from app.player_table import PlayerTable, intern_names
+from app.premier_selector import Snapshot
+
+SNAPSHOT_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+
+# Published versions kept on disk, so workers still reading an older one are not cut off
+KEEP_VERSIONS = 3
+
+# Seconds between a worker's checks for a newly published version
+CHECK_INTERVAL = 1.0
+
+# Columns published for every player, read by the workers without copying
+PLAYER_DTYPE = np.dtype([
+    ('id', 'i4'),
+    ('name', 'U40'),
+    ('element_type', 'i1'),
+    ('form', 'f8'),
+    ('predicted', 'f8'),
+    ('total_points', 'i2'),
+    ('team', 'i2'),
+    ('now_cost', 'i2'),
+])
+
+# Fields of each player's data the workers look players up by
+PUBLISHED_FIELDS = ('id', 'web_name', 'element_type', 'team', 'total_points', 'now_cost')
+
+# Function to get the directory a snapshot version is published to
+def version_dir(snapshot_dir, version):
+    return os.path.join(snapshot_dir, f"v{version}")
+
+# Function to write a snapshot to disk and then point the workers at it in one rename
+def publish_snapshot(snapshot, snapshot_dir=SNAPSHOT_DIR):
+    target_dir = version_dir(snapshot_dir, snapshot.version)
+    temp_dir = target_dir + ".tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+
+    table = snapshot.players
+    players = np.zeros(len(table), dtype=PLAYER_DTYPE)
+    players['id'] = table.ids
+    players['name'] = table.name_column()
+    players['element_type'] = table.position_ids
+    players['form'] = table.forms
+    players['predicted'] = table.predicted
+    players['total_points'] = table.points
+    players['team'] = table.team_ids
+    players['now_cost'] = table.values
+    np.save(os.path.join(temp_dir, "players.npy"), players)
+    np.save(os.path.join(temp_dir, "history.npy"), np.asarray(snapshot.history.rows))
+    meta = {
+        'version': snapshot.version,
+        'players_data': [{field: player_data.get(field) for field in PUBLISHED_FIELDS} for player_data in snapshot.players_data],
+        'teams': snapshot.teams,
+        'events': snapshot.data.get('events', []),
+        'fixtures': snapshot.team_data or [],
+        'upcoming': [[team_id, list(fixture)] for team_id, fixture in snapshot.upcoming.items()],
+    }
+    with open(os.path.join(temp_dir, "meta.json"), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.rename(temp_dir, target_dir)
+    current_path = os.path.join(snapshot_dir, CURRENT_FILE)
+    with open(current_path + ".tmp", 'w') as f:
+        f.write(str(snapshot.version))
+    os.replace(current_path + ".tmp", current_path)
+    remove_old_versions(snapshot_dir, snapshot.version)
+
+# Function to delete published versions older than the last KEEP_VERSIONS.
+# Workers that still map files of a deleted version keep reading them until they move on.
+def remove_old_versions(snapshot_dir, current_version):
+    for name in os.listdir(snapshot_dir):
+        if name.startswith('v') and name[1:].isdigit() and int(name[1:]) <= current_version - KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
+
+# Function to read the version the loader last published, or None if nothing has been published
+def read_current_version(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_FILE)) as f:
+            return int(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Function to attach to a published snapshot, mapping its arrays rather than loading them
+def load_published_snapshot(snapshot_dir, version):
+    directory = version_dir(snapshot_dir, version)
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    players_array = np.load(os.path.join(directory, "players.npy"), mmap_mode='r')
+    history = HistoryTable(np.load(os.path.join(directory, "history.npy"), mmap_mode='r'))
+
+    players_data = meta['players_data']
+    teams = meta['teams']
+    index = PlayerIndex(players_data, teams)
+
+    # The numeric columns stay mapped; only the names are read into the interned name table
+    name_ids, names = intern_names(players_array['name'].tolist())
+    players = PlayerTable(
+        players_array['id'], players_array['element_type'], players_array['team'], players_array['form'],
+        players_array['predicted'], players_array['total_points'], players_array['now_cost'],
+        name_ids, names, index.clubs_by_team,
+    )
+    data = {'elements': players_data, 'teams': teams, 'events': meta['events']}
+    upcoming = {team_id: tuple(fixture) for team_id, fixture in meta['upcoming']}
+
+    # The player frame and model stay in the loader process, workers only serve what it published
+    snapshot = Snapshot(data, players_data, teams, index, meta['fixtures'], upcoming, history, None, None, players)
+    snapshot.version = meta['version']
+    return snapshot
+
+# Class to serve the snapshots published by the loader process, with the same interface as DataService
+class SharedSnapshotReader:
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR, check_interval=CHECK_INTERVAL):
+        self.snapshot_dir = snapshot_dir
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.error = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    @property
+    def version(self):
+        snapshot = self.snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    # Function to check whether a snapshot has been published and attached
+    def is_ready(self):
+        return self.get_snapshot() is not None
+
+    # Function to get the current snapshot, switching to a newer published version at most once per check interval
+    def get_snapshot(self):
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            self.refresh()
+        return self.snapshot
+
+    # Function to wait until the loader has published a snapshot
+    def wait_for_snapshot(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.refresh() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.check_interval)
+        return self.snapshot
+
+    # Function to attach to the published snapshot; workers never build data themselves
+    def start_warmup(self):
+        self.get_snapshot()
+        return None
+
+    # Function to attach to the latest published version if it is newer than the current one
+    def refresh(self, full=False):
+        # Only one thread attaches while the others keep serving the current snapshot
+        if not self.lock.acquire(blocking=False):
+            return self.snapshot
+        try:
+            self.checked_at = time.monotonic()
+            version = read_current_version(self.snapshot_dir)
+            if version is None or (self.snapshot is not None and version == self.snapshot.version):
+                return self.snapshot
+            try:
+                self.snapshot = load_published_snapshot(self.snapshot_dir, version)
+                self.error = None
+            except (OSError, ValueError, KeyError) as e:
+                self.error = e
+                print(f"Error loading published snapshot v{version}: {e}")
+            return self.snapshot
+        finally:
+            self.lock.release()
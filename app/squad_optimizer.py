@@ -0,0 +1,138 @@
+import numpy as np
+
+# Budget for the whole squad, in tenths of a million like now_cost
+SQUAD_BUDGET = 1000
+
+# Maximum number of players picked from one club
+MAX_PER_CLUB = 3
+
+# Number of squad players needed for each position
+SQUAD_POSITIONS = {1: 2, 2: 5, 3: 5, 4: 3}
+
+# Smallest and largest number of starters for each position
+STARTING_POSITIONS = {1: (1, 1), 2: (3, 5), 3: (2, 5), 4: (1, 3)}
+STARTING_SIZE = 11
+
+# Seconds the solver may spend on each stage, so a pick fits inside a callback
+TIME_LIMIT = 0.05
+
+# Relative slack on the best XI score when the bench is picked, so rounding in the solver cannot make it infeasible
+XI_TOLERANCE = 1e-6
+
+# Class to hold a selected squad and its starting XI
+class Squad:
+    def __init__(self, players, starting_xi, score, optimal=True):
+        self.players = players
+        self.starting_xi = starting_xi
+        self.bench = [player for player in players if player not in starting_xi]
+        self.cost = sum(player.value for player in players)
+        self.projected_form = sum(score(player) for player in starting_xi)
+        self.optimal = optimal  # False if the solver stopped at its time limit
+
+# Function to drop players who can always be swapped for a cheaper player with at least the same score
+def prune_dominated(players, score, locked_ids):
+    # A squad holds at most this many full clubs, each of which can block a swap
+    full_clubs = sum(SQUAD_POSITIONS.values()) // MAX_PER_CLUB
+    kept = []
+    for position_id, count in SQUAD_POSITIONS.items():
+        position_players = [player for player in players if player.position_id == position_id]
+        position_players.sort(key=lambda player: (-score(player), player.value, player.id))
+
+        # Cheapest cost seen so far for each club among better ranked players
+        club_min_cost = {}
+        for player in position_players:
+            better_clubs = sum(1 for cost in club_min_cost.values() if cost <= player.value)
+            if player.id in locked_ids or better_clubs < count + full_clubs:
+                kept.append(player)
+            if player.value < club_min_cost.get(player.club, float('inf')):
+                club_min_cost[player.club] = player.value
+    return kept
+
+# Function to pick the best 15-man squad and starting XI under the FPL rules
+def optimize_squad(players, locked_ids=(), excluded_ids=(), budget=SQUAD_BUDGET, score=lambda player: player.predicted, time_limit=TIME_LIMIT):
+    # SciPy comes with scikit-learn but is slow to import, so only load it when a squad is picked
+    from scipy.optimize import milp, LinearConstraint, Bounds
+    from scipy.sparse import eye, hstack
+
+    locked_ids = set(locked_ids)
+    excluded_ids = set(excluded_ids)
+    if locked_ids & excluded_ids:
+        raise ValueError("A player cannot be both locked in and excluded")
+    players = [player for player in players if player.position_id in SQUAD_POSITIONS and player.id not in excluded_ids]
+    players = prune_dominated(players, score, locked_ids)
+    n = len(players)
+    if not n:
+        raise ValueError("No players available to pick a squad from")
+
+    # Variables are squad picks for every player followed by starting picks for every player
+    form = np.array([score(player) for player in players], dtype=float)
+    cost = np.array([player.value for player in players], dtype=float)
+    positions = np.array([player.position_id for player in players])
+    clubs = [player.club for player in players]
+
+    rows, lower, upper = [], [], []
+
+    def add_constraint(squad_coefficients, starting_coefficients, low, high):
+        rows.append(np.concatenate((squad_coefficients, starting_coefficients)))
+        lower.append(low)
+        upper.append(high)
+
+    zeros = np.zeros(n)
+    add_constraint(cost, zeros, 0, budget)
+    for position_id, count in SQUAD_POSITIONS.items():
+        in_position = (positions == position_id).astype(float)
+        add_constraint(in_position, zeros, count, count)
+        low, high = STARTING_POSITIONS[position_id]
+        add_constraint(zeros, in_position, low, high)
+    add_constraint(zeros, np.ones(n), STARTING_SIZE, STARTING_SIZE)
+    for club in set(clubs):
+        in_club = np.array([player_club == club for player_club in clubs], dtype=float)
+        add_constraint(in_club, zeros, 0, MAX_PER_CLUB)
+
+    # A starter must also be in the squad
+    linking = hstack((-eye(n), eye(n)), format='csr')
+
+    constraints = [LinearConstraint(np.array(rows), lower, upper), LinearConstraint(linking, -np.inf, 0)]
+    lower_bounds = np.zeros(2 * n)
+    lower_bounds[:n] = [1 if player.id in locked_ids else 0 for player in players]
+    upper_bounds = np.ones(2 * n)
+
+    def solve(objective, extra_constraints=()):
+        return milp(
+            objective,
+            constraints=constraints + list(extra_constraints),
+            integrality=np.ones(2 * n),
+            bounds=Bounds(lower_bounds, upper_bounds),
+            options={'time_limit': time_limit},
+        )
+
+    # On a time limit the solver still returns the best squad it has found
+    def check(result):
+        if result.x is None:
+            raise ValueError(f"No valid squad could be picked: {result.message}")
+        return result
+
+    # Pick the best starting XI first, then the best bench to go with it. Weighting both in
+    # one objective is several times slower to solve.
+    result = check(solve(-np.concatenate((zeros, form))))
+    optimal = result.success
+    starters = np.round(result.x[n:])
+
+    # Hold the XI to its best score rather than to the XI found, since another XI with the same score may allow a better bench
+    best_xi = -result.fun
+    xi_floor = LinearConstraint(np.concatenate((zeros, form)), best_xi - XI_TOLERANCE * max(1, abs(best_xi)), np.inf)
+    result = solve(-np.concatenate((form, zeros)), [xi_floor])
+    if result.x is None:
+        # Out of time before any squad was found, so pick the bench around the XI found first, which solves much faster
+        lower_bounds[n:] = upper_bounds[n:] = starters
+        lower_bounds[:n] = np.maximum(lower_bounds[:n], starters)
+        result = check(solve(-np.concatenate((form, zeros))))
+        optimal = False
+    optimal = optimal and result.success
+
+    picks = np.round(result.x).astype(bool)
+    squad = [player for player, picked in zip(players, picks[:n]) if picked]
+    starting_xi = [player for player, picked in zip(players, picks[n:]) if picked]
+    squad.sort(key=lambda player: (player.position_id, -score(player)))
+    starting_xi.sort(key=lambda player: (player.position_id, -score(player)))
+    return Squad(squad, starting_xi, score, optimal)
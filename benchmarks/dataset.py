@@ -0,0 +1,118 @@
+import random
+import datetime
+from app.fpl_cache import FplCache, CacheEntry
+from app.history_store import build_history_table, save_history_table
+
+# Shape of the benchmark season: 20 clubs of 35 players gives 700 players
+NUM_TEAMS = 20
+SQUAD_SHAPE = ((1, 3), (2, 10), (3, 12), (4, 10))
+NUM_GAMEWEEKS = 38
+FINISHED_GAMEWEEKS = 37
+SEED = 2024
+
+SEASON_START = datetime.datetime(2023, 8, 11, 17, 30)
+
+# Function to format a datetime like the FPL API does
+def fpl_time(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# Function to generate the same FPL season every time, as bootstrap-static, fixtures and per-player histories
+def generate_season(seed=SEED, num_teams=NUM_TEAMS, finished_gameweeks=FINISHED_GAMEWEEKS):
+    rng = random.Random(seed)
+    teams = [{'id': team_id, 'name': f"Club {team_id}", 'short_name': f"C{team_id:02d}", 'code': team_id, 'strength': rng.randint(2, 5)} for team_id in range(1, num_teams + 1)]
+
+    events = []
+    fixtures = []
+    for gameweek in range(1, NUM_GAMEWEEKS + 1):
+        deadline = SEASON_START + datetime.timedelta(days=7 * (gameweek - 1))
+        finished = gameweek <= finished_gameweeks
+        events.append({
+            'id': gameweek,
+            'name': f"Gameweek {gameweek}",
+            'deadline_time': fpl_time(deadline),
+            'finished': finished,
+            'data_checked': finished,
+            'is_current': gameweek == finished_gameweeks,
+            'is_next': gameweek == finished_gameweeks + 1,
+        })
+        order = list(range(1, num_teams + 1))
+        rng.shuffle(order)
+        for home, away in zip(order[::2], order[1::2]):
+            fixtures.append({
+                'id': len(fixtures) + 1,
+                'event': gameweek,
+                'team_h': home,
+                'team_a': away,
+                'finished': finished,
+                'team_h_difficulty': rng.randint(2, 5),
+                'team_a_difficulty': rng.randint(2, 5),
+                'kickoff_time': fpl_time(deadline + datetime.timedelta(days=1)),
+            })
+
+    team_fixtures = {}
+    for fixture in fixtures:
+        if fixture['finished']:
+            team_fixtures.setdefault(fixture['team_h'], []).append((fixture, True))
+            team_fixtures.setdefault(fixture['team_a'], []).append((fixture, False))
+
+    elements = []
+    histories = {}
+    for team in teams:
+        for element_type, count in SQUAD_SHAPE:
+            for _ in range(count):
+                player_id = len(elements) + 1
+                # Every 97th player shares a name, like the real game's duplicate web names
+                web_name = "Smith" if player_id % 97 == 0 else f"Player {player_id}"
+                player_data = {
+                    'id': player_id,
+                    'web_name': web_name,
+                    'first_name': "Benchmark",
+                    'second_name': web_name,
+                    'element_type': element_type,
+                    'team': team['id'],
+                    'now_cost': rng.randint(40, 130),
+                    'total_points': 0,
+                    'minutes': 0,
+                    'form': "0.0",
+                }
+                history = []
+                for fixture, was_home in team_fixtures.get(team['id'], []):
+                    minutes = rng.choice([0, 0, 20, 45, 90, 90, 90])
+                    goals = rng.randint(0, 2) if minutes and element_type > 1 else 0
+                    assists = rng.randint(0, 1) if minutes else 0
+                    clean_sheets = rng.randint(0, 1) if minutes >= 60 else 0
+                    entry = {
+                        'element': player_id,
+                        'fixture': fixture['id'],
+                        'round': fixture['event'],
+                        'opponent_team': fixture['team_a'] if was_home else fixture['team_h'],
+                        'was_home': was_home,
+                        'minutes': minutes,
+                        'goals_scored': goals,
+                        'assists': assists,
+                        'clean_sheets': clean_sheets,
+                        'goals_conceded': rng.randint(0, 3),
+                        'saves': rng.randint(0, 6) if element_type == 1 else 0,
+                        'penalties_saved': rng.randint(0, 1) if element_type == 1 else 0,
+                        'bonus': rng.randint(0, 3) if minutes else 0,
+                        'total_points': (2 if minutes else 0) + 4 * goals + 3 * assists + 4 * clean_sheets,
+                        'value': player_data['now_cost'],
+                        'kickoff_time': fixture['kickoff_time'],
+                    }
+                    history.append(entry)
+                    player_data['total_points'] += entry['total_points']
+                    player_data['minutes'] += minutes
+                elements.append(player_data)
+                histories[player_id] = history
+
+    bootstrap = {'elements': elements, 'teams': teams, 'events': events, 'element_types': [], 'last_updated': 1700000000}
+    return bootstrap, fixtures, histories
+
+# Function to write the season where the app reads its cached data, fresh so nothing is fetched
+def write_season(data_dir, seed=SEED):
+    bootstrap, fixtures, histories = generate_season(seed)
+    cache = FplCache(data_dir)
+    for filename, data in (("player_data.json", bootstrap), ("team_data.json", fixtures)):
+        cache.save_entry(filename, CacheEntry(data))
+    save_history_table(build_history_table(histories), data_dir)
+    return bootstrap, fixtures, histories
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The benchmarks run from a scratch directory, so keep the repository importable
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+# Code timed in a fresh interpreter for the cold start benchmark
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from app.premier_selector import build_snapshot
+imported = time.perf_counter()
+build_snapshot()
+built = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'build_ms': (built - imported) * 1000}))
+"""
+
+# Function to summarise a list of timings in milliseconds
+def summarize(timings, count=None):
+    timings = sorted(timings)
+    result = {
+        'runs': len(timings),
+        'min_ms': timings[0],
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.fmean(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+    }
+    if count is not None:
+        # Items handled per second at the median timing
+        result['per_second'] = count / (result['median_ms'] / 1000) if result['median_ms'] else None
+    return result
+
+# Function to time a function, running setup untimed before every run
+def measure(func, repeat, setup=None, count=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings, count)
+
+# Function to time the import and first build of the pipeline in a fresh interpreter
+def measure_cold_start(work_dir, repeat):
+    imports, builds, peaks = [], [], []
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    for _ in range(repeat):
+        before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], cwd=work_dir, env=env, capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        imports.append(result['import_ms'])
+        builds.append(result['build_ms'])
+        peaks.append(max(before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+    return {
+        'import': summarize(imports),
+        'build': summarize(builds),
+        'peak_rss_mb': max(peaks) / 1024,  # ru_maxrss is in kilobytes on Linux
+    }
+
+# Function to run every benchmark against the fixed season in work_dir
+def run_benchmarks(work_dir, repeat):
+    from benchmarks.dataset import write_season
+    bootstrap, fixtures, histories = write_season(os.path.join(work_dir, "fpl_data"))
+    os.chdir(work_dir)
+
+    import app.premier_selector as premier_selector
+    import app.player_stats_layout as player_stats_layout
+    import app.dash_layout as dash_layout
+    from app import app as server
+    from app.data_service import data_service
+    from app.figure_cache import figure_cache
+    from app.fixture_matrix import build_fixture_matrix
+    from app.form_model import train_form_model, save_form_model
+    from app.history_store import WINDOW_SIZE
+    from app.player_form_calculator import (
+        calculate_form_table, calculate_goalkeeper_form, calculate_defender_form,
+        calculate_midfielder_form, calculate_forward_form,
+    )
+    from app.squad_optimizer import optimize_squad
+
+    # Background rendering would compete with the timed code
+    player_stats_layout.PRERENDER_TOP_PLAYERS = False
+
+    results = {}
+    players_data = bootstrap['elements']
+    history = premier_selector.load_histories([player_data['id'] for player_data in players_data])
+
+    start = time.perf_counter()
+    save_form_model(train_form_model(history, players_data, fixtures))
+    results['train_form_model'] = summarize([(time.perf_counter() - start) * 1000])
+
+    results['cold_start'] = measure_cold_start(work_dir, max(1, repeat // 5))
+
+    def clear_metrics():
+        premier_selector._player_metrics.clear()
+
+    results['build_snapshot_uncached'] = measure(premier_selector.build_snapshot, repeat, setup=clear_metrics)
+    results['build_snapshot_warm'] = measure(premier_selector.build_snapshot, repeat)
+
+    tracemalloc.start()
+    clear_metrics()
+    premier_selector.build_snapshot()
+    results['build_snapshot_peak_python_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+
+    player_ids = [player_data['id'] for player_data in players_data]
+    element_types = [player_data['element_type'] for player_data in players_data]
+    calculators = {1: calculate_goalkeeper_form, 2: calculate_defender_form, 3: calculate_midfielder_form, 4: calculate_forward_form}
+
+    def per_player_forms():
+        for player_id, element_type in zip(player_ids, element_types):
+            calculators[element_type](player_id, history)
+
+    results['form_table'] = measure(lambda: calculate_form_table(history, player_ids, element_types), repeat, count=len(player_ids))
+    results['form_calculators_per_player'] = measure(per_player_forms, repeat, count=len(player_ids))
+
+    snapshot = data_service.wait_for_snapshot()
+    players = snapshot.players
+
+    def select_all_positions():
+        for position_id, count in ((1, 10), (2, 12), (3, 12), (4, 10)):
+            premier_selector.select_players(position_id, count, players)
+
+    results['select_players'] = measure(select_all_positions, repeat * 10)
+    results['ranking_top_k'] = measure(lambda: [snapshot.ranking.top_k(position_id, 10) for position_id in (1, 2, 3, 4)], repeat * 10)
+    results['ranking_form_window'] = measure(lambda: snapshot.selection(5), repeat * 10, setup=snapshot.window_rankings.clear)
+    results['ranking_top_k_fixtures'] = measure(lambda: [snapshot.ranking.top_k(position_id, 10, fixture_weeks=5) for position_id in (1, 2, 3, 4)], repeat * 10)
+    results['build_fixture_matrix'] = measure(lambda: build_fixture_matrix(fixtures), repeat)
+    results['optimize_squad'] = measure(lambda: optimize_squad(players), repeat)
+
+    # Post to update_layout through Dash, so serialization is timed along with rendering
+    client = server.test_client()
+
+    def post_update_layout(pathname, trigger, rendered_view=None):
+        body = {
+            'output': '..graphs-container.children...interval-component.interval...rendered-view.data..',
+            'outputs': [
+                {'id': 'graphs-container', 'property': 'children'},
+                {'id': 'interval-component', 'property': 'interval'},
+                {'id': 'rendered-view', 'property': 'data'},
+            ],
+            'inputs': [
+                {'id': 'interval-component', 'property': 'n_intervals', 'value': 1},
+                {'id': 'url', 'property': 'pathname', 'value': pathname},
+                {'id': 'form-window', 'property': 'value', 'value': WINDOW_SIZE},
+            ],
+            'state': [{'id': 'rendered-view', 'property': 'data', 'value': rendered_view}],
+            'changedPropIds': [trigger],
+        }
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"update_layout returned {response.status_code}")
+
+    def clear_rendered_rankings():
+        dash_layout._rendered_rankings = (None, None)
+
+    results['update_layout_uncached'] = measure(lambda: post_update_layout('/', 'url.pathname'), repeat, setup=clear_rendered_rankings)
+    results['update_layout_cached'] = measure(lambda: post_update_layout('/', 'url.pathname'), repeat * 10)
+    unchanged_view = [snapshot.version, '/', WINDOW_SIZE]
+    results['update_layout_idle_tick'] = measure(lambda: post_update_layout('/', 'interval-component.n_intervals', unchanged_view), repeat * 10)
+
+    # A spread of players across every position
+    sample = [player_data for player_data in players_data if player_data['web_name'] != "Smith"][::35]
+    sample_names = [player_data['web_name'] for player_data in sample]
+
+    def load_sample():
+        for name in sample_names:
+            player_stats_layout.load_player_stats(name)
+
+    def generate_sample():
+        for player_data in sample:
+            rows = snapshot.history.player_rows(player_data['id'])
+            player_stats_layout.generate_player_figure(rows, player_data['web_name'], player_data['element_type'])
+
+    results['generate_player_figure'] = measure(generate_sample, repeat, count=len(sample))
+    results['load_player_stats_uncached'] = measure(load_sample, repeat, setup=figure_cache.clear, count=len(sample))
+    results['load_player_stats_cached'] = measure(load_sample, repeat, count=len(sample))
+
+    results['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+# Function to compare results with a baseline run, as the change of each median in percent
+def compare(results, baseline):
+    changes = {}
+
+    def walk(current, previous, prefix):
+        for name, value in current.items():
+            if name not in previous:
+                continue
+            if isinstance(value, dict) and 'median_ms' in value:
+                if previous[name].get('median_ms'):
+                    changes[prefix + name] = (value['median_ms'] / previous[name]['median_ms'] - 1) * 100
+            elif isinstance(value, dict):
+                walk(value, previous[name], f"{prefix}{name}.")
+
+    walk(results['results'], baseline['results'], "")
+    return changes
+
+# Function to get the commit the benchmarks ran against, if the repository is available
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PremierPick data and render pipeline on a fixed season")
+    parser.add_argument('--output', default="benchmark_results.json", help="file to write the JSON results to")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--repeat', type=int, default=10, help="runs of each benchmark")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    with tempfile.TemporaryDirectory(prefix="premierpick-bench-") as work_dir:
+        results = {
+            'meta': {
+                'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': args.repeat,
+            },
+            'results': run_benchmarks(work_dir, args.repeat),
+        }
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            results['changes_percent'] = compare(results, json.load(f))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    def report(values, prefix):
+        for name, value in values.items():
+            if isinstance(value, dict) and 'median_ms' in value:
+                print(f"{prefix + name:32} {value['median_ms']:10.2f} ms")
+            elif isinstance(value, dict):
+                report(value, f"{prefix}{name}.")
+            else:
+                print(f"{prefix + name:32} {value:10.2f} MB")
+
+    report(results['results'], "")
+    for name, change in results.get('changes_percent', {}).items():
+        print(f"{name:32} {change:+9.1f} %")
+    print(f"Results written to {output}")
+
+if __name__ == '__main__':
+    main()
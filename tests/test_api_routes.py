@@ -0,0 +1,146 @@
+import gzip
+import pytest
+from app import app, api_routes, premier_selector
+from app.api_routes import API_CACHE_BYTES, API_PREFIX, MAX_PAGE_SIZE
+from app.data_service import data_service
+from app.figure_cache import VersionedLRU
+from app.history_store import SEASON_FIXTURES, build_history_table
+from app.player_index import PlayerIndex
+from app.premier_selector import Snapshot, build_players
+
+PLAYER_COUNT = 120
+TEAM_COUNT = 10
+
+# Function to build a snapshot of generated players, clubs, fixtures and histories without touching the API
+def make_snapshot():
+    teams = [{'id': team_id, 'name': f"Club {team_id}"} for team_id in range(1, TEAM_COUNT + 1)]
+    players_data = [
+        {'id': player_id, 'web_name': f"Player {player_id}", 'element_type': player_id % 4 + 1, 'team': player_id % TEAM_COUNT + 1,
+         'total_points': player_id * 3 % 50, 'now_cost': 40 + player_id % 60}
+        for player_id in range(1, PLAYER_COUNT + 1)
+    ]
+    histories = {
+        player_data['id']: [
+            {'fixture': round_id * 100 + player_data['team'], 'round': round_id, 'minutes': 90, 'was_home': round_id % 2 == 0,
+             'total_points': (player_data['id'] * 7 + round_id * 3) % 11}
+            for round_id in range(1, 11)
+        ]
+        for player_data in players_data
+    }
+    team_data = [
+        {'id': 1000 + team_id, 'event': 11, 'team_h': team_id, 'team_a': team_id + 1, 'team_h_difficulty': 2, 'team_a_difficulty': 4, 'finished': False}
+        for team_id in range(1, TEAM_COUNT, 2)
+    ]
+    history = build_history_table(histories)
+    index = PlayerIndex(players_data, teams)
+    df, players = build_players(players_data, index, history)
+    snapshot = Snapshot({'elements': players_data, 'teams': teams, 'events': []}, players_data, teams, index, team_data, {}, history, df, None, players)
+    snapshot.version = 1
+    return snapshot
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(premier_selector, '_player_metrics', {})
+    monkeypatch.setattr(data_service, 'snapshot', make_snapshot())
+    monkeypatch.setattr(api_routes, 'api_cache', VersionedLRU(API_CACHE_BYTES))
+    return app.test_client()
+
+
+def test_rankings_are_paginated(client):
+    everyone = client.get(f"{API_PREFIX}/rankings/midfielders?per_page={MAX_PAGE_SIZE}").get_json()
+    assert everyone['total'] == PLAYER_COUNT // 4
+    forms = [player['form'] for player in everyone['players']]
+    assert forms == sorted(forms, reverse=True)
+
+    page = client.get(f"{API_PREFIX}/rankings/3?page=2&per_page=4").get_json()
+    assert (page['page'], page['per_page'], page['pages']) == (2, 4, 8)
+    assert [player['rank'] for player in page['players']] == [5, 6, 7, 8]
+    assert [player['id'] for player in page['players']] == [player['id'] for player in everyone['players'][4:8]]
+
+    # A page past the end is empty rather than an error, and page sizes are capped
+    assert client.get(f"{API_PREFIX}/rankings/3?page=99").get_json()['players'] == []
+    assert client.get(f"{API_PREFIX}/rankings/3?per_page=100000").get_json()['per_page'] == MAX_PAGE_SIZE
+
+
+def test_rankings_filter_by_price_and_club(client):
+    players = client.get(f"{API_PREFIX}/rankings/defenders?max_price=6.5&club=Club 2&per_page=500").get_json()['players']
+    assert players
+    assert all(player['price'] <= 6.5 and player['club'] == "Club 2" for player in players)
+
+
+@pytest.mark.parametrize('query', [
+    "/rankings/keepers",
+    "/rankings/1?k=abc",
+    "/rankings/1?k=0",
+    "/rankings/1?metric=luck",
+    "/rankings/1?max_price=inf",
+    "/rankings/1?max_price=-inf",
+    "/rankings/1?max_price=nan",
+    "/rankings/1?max_price=1e400",
+    "/rankings/1?window=0",
+    "/rankings/1?page=0",
+    "/rankings/1?per_page=0",
+    "/players?page=x",
+    "/players/3?window=-1",
+])
+def test_bad_parameters_are_rejected(client, query):
+    response = client.get(API_PREFIX + query)
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+def test_windows_past_a_season_are_cut_to_one(client):
+    assert client.get(f"{API_PREFIX}/rankings/2?window=1000").get_json()['window'] == SEASON_FIXTURES
+    assert client.get(f"{API_PREFIX}/players/5?window=1000").get_json()['form']['window'] == SEASON_FIXTURES
+
+
+def test_player_history_and_unknown_player(client):
+    player = client.get(f"{API_PREFIX}/players/5?window=3").get_json()
+    assert player['player']['id'] == 5
+    assert [row['round'] for row in player['history']] == list(range(1, 11))
+    assert player['form']['score'] == pytest.approx(sum(row['total_points'] for row in player['history'][-3:]) / 3)
+
+    response = client.get(f"{API_PREFIX}/players/99999")
+    assert response.status_code == 404
+    assert response.get_json()['error']
+
+
+def test_revalidation_answers_not_modified(client):
+    response = client.get(f"{API_PREFIX}/players")
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['X-Data-Version'] == "1"
+
+    revalidated = client.get(f"{API_PREFIX}/players", headers={'If-None-Match': etag})
+    assert api_routes.api_cache.hits == 1
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers['ETag'] == etag
+
+    # The same query in another order shares the payload, while a new data version changes it
+    assert client.get(f"{API_PREFIX}/rankings/1?k=5&metric=form").headers['ETag'] == client.get(f"{API_PREFIX}/rankings/1?metric=form&k=5").headers['ETag']
+    data_service.snapshot.version = 2
+    assert client.get(f"{API_PREFIX}/players", headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_gzip_is_negotiated(client):
+    plain = client.get(f"{API_PREFIX}/players?per_page={MAX_PAGE_SIZE}")
+    zipped = client.get(f"{API_PREFIX}/players?per_page={MAX_PAGE_SIZE}", headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+
+    # Small payloads are sent as they are
+    small = client.get(f"{API_PREFIX}/rankings/1?k=1", headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < api_routes.MIN_GZIP_SIZE
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_loading_data_answers_service_unavailable(client, monkeypatch):
+    monkeypatch.setattr(data_service, 'snapshot', None)
+    monkeypatch.setattr(data_service, 'start_warmup', lambda: None)
+    response = client.get(f"{API_PREFIX}/players")
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(api_routes.RETRY_AFTER)
@@ -0,0 +1,55 @@
+import json
+import pytest
+from app.bootstrap_parser import parse_bootstrap, reduce_bootstrap
+
+# A bootstrap-static payload with multibyte names, escapes, numbers of every shape and values the parser drops
+PAYLOAD = {
+    'events': [
+        {'id': 1, 'name': "Gameweek 1", 'deadline_time': "2024-08-16T17:30:00Z", 'finished': True, 'data_checked': True,
+         'is_current': False, 'is_next': False, 'chip_plays': [{'chip_name': "bboost", 'num_played': 123456}], 'top_element_info': None},
+        {'id': 2, 'deadline_time': None, 'finished': False, 'data_checked': False, 'is_current': True, 'is_next': False},
+    ],
+    'game_settings': {'league_join_private_max': 30, 'squad_squadsize': 15, 'timezone': "UTC", 'nested': [[1, [2, [3.5e-3]]], {}]},
+    'teams': [
+        {'id': 1, 'name': "Brighton & Hove Albion", 'short_name': "BHA", 'strength': 3},
+        {'id': 20, 'name': "Wolverhampton Wanderers \"Wolves\"", 'short_name': "WOL", 'pulse_id': 38},
+    ],
+    'total_players': 10234567,
+    'elements': [
+        {'id': 1, 'web_name': "Ødegaard", 'element_type': 3, 'team': 1, 'total_points': 212, 'now_cost': 85, 'form': "6.5", 'ep_next': -0.25},
+        {'id': 2, 'web_name': "손흥민", 'element_type': 3, 'team': 20, 'total_points': -3, 'now_cost': 100, 'selected_by_percent': "12.30"},
+        {'id': 123456789, 'web_name': "Dúbravka 🧤\\né", 'element_type': 1, 'team': 20, 'total_points': 0, 'now_cost': 45},
+        {'id': 4, 'web_name': "Müller", 'element_type': 4, 'team': 1, 'total_points': 98765, 'now_cost': 1e2},
+    ],
+    'element_stats': [],
+    'element_types': [{'id': 1, 'singular_name': "Goalkeeper", 'squad_min_play': 1}],
+    'last_updated': 1723456789.125,
+}
+
+# Function to split bytes into chunks of a given size; the parser is given the same read size, so every chunk end is a buffer end
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7])
+@pytest.mark.parametrize('indent', [None, 2])
+@pytest.mark.parametrize('ensure_ascii', [False, True])
+def test_stream_parse_matches_full_parse(chunk_size, indent, ensure_ascii):
+    text = json.dumps(PAYLOAD, indent=indent, ensure_ascii=ensure_ascii).encode('utf-8')
+    assert parse_bootstrap(chunked(text, chunk_size), chunk_size) == reduce_bootstrap(json.loads(text))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7])
+def test_numbers_cut_at_a_chunk_end_are_read_whole(chunk_size):
+    # Every number ends where a chunk might, so a number read before the rest of it arrived would come out short
+    elements = [{'id': 10 ** width + width, 'web_name': "x", 'element_type': 2, 'team': 1, 'total_points': -(10 ** width), 'now_cost': 12.5 * width} for width in range(1, 12)]
+    text = json.dumps({'elements': elements, 'last_updated': 17234567890}, separators=(',', ':')).encode('utf-8')
+    for offset in range(chunk_size):
+        chunks = [text[:offset]] + chunked(text[offset:], chunk_size)
+        assert parse_bootstrap(chunks, chunk_size) == reduce_bootstrap(json.loads(text))
+
+
+@pytest.mark.parametrize('text', [b'', b'{"elements": [', b'{"elements": [1]}', b'{"teams": [{"id": 1}', b'[]'])
+def test_malformed_payload_raises_value_error(text):
+    with pytest.raises(ValueError):
+        parse_bootstrap(chunked(text, 2), 2)
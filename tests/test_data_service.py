@@ -0,0 +1,84 @@
+import threading
+from app.data_service import DataService
+
+# Class to stand in for a snapshot built by the service
+class FakeSnapshot:
+    version = None
+    team_data = []
+    data = {}
+
+
+def test_concurrent_refreshes_share_one_build():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def builder():
+        calls.append(threading.current_thread().name)
+        started.set()
+        release.wait(5)
+        return FakeSnapshot()
+
+    service = DataService(builder)
+    results = []
+    first = threading.Thread(target=lambda: results.append(service.refresh()))
+    first.start()
+    assert started.wait(5)
+
+    # A refresh asked for while the first is building waits for it instead of building again
+    second = threading.Thread(target=lambda: results.append(service.refresh()))
+    second.start()
+    second.join(0.1)
+    assert second.is_alive()
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(calls) == 1
+    assert service.version == 1
+    assert results == [service.snapshot, service.snapshot]
+
+
+def test_joined_refresh_reports_a_failed_build():
+    started = threading.Event()
+    release = threading.Event()
+
+    def builder():
+        started.set()
+        release.wait(5)
+        raise IOError("upstream is down")
+
+    service = DataService(builder)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.refresh())) for _ in range(2)]
+    threads[0].start()
+    assert started.wait(5)
+    threads[1].start()
+    threads[1].join(0.1)
+    assert threads[1].is_alive()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [None, None]
+    assert service.version == 0
+
+
+def test_no_warmup_starts_once_the_scheduler_retries():
+    calls = []
+
+    def builder():
+        calls.append(1)
+        raise IOError("upstream is down")
+
+    service = DataService(builder, scheduled=True)
+    try:
+        assert service.wait_for_snapshot(5) is None
+        assert len(calls) == 1
+        assert service.scheduler.is_running()
+
+        # Even once the backoff has passed, the scheduler's own retry is the only one
+        service.retry_at = 0
+        assert service.start_warmup() is None
+        assert len(calls) == 1
+    finally:
+        service.scheduler.stop()
@@ -0,0 +1,98 @@
+import copy
+import numpy as np
+import pytest
+from app import fixture_matrix
+from app.fixture_matrix import NEUTRAL_DIFFICULTY, build_fixture_matrix, difficulty_weight, get_fixture_matrix
+
+# Function to make a fixture between two teams, with the difficulty each side faces
+def make_fixture(fixture_id, event, home, away, home_difficulty=NEUTRAL_DIFFICULTY, away_difficulty=NEUTRAL_DIFFICULTY, finished=False):
+    return {
+        'id': fixture_id, 'event': event, 'team_h': home, 'team_a': away,
+        'team_h_difficulty': home_difficulty, 'team_a_difficulty': away_difficulty, 'finished': finished,
+    }
+
+# Function to make a season of four teams where team 1 blanks in gameweek 3 and plays twice in gameweek 4
+def make_fixtures():
+    return [
+        make_fixture(1, 1, 1, 2, finished=True),
+        make_fixture(2, 1, 3, 4, finished=True),
+        make_fixture(3, 2, 2, 1, 4, 2),
+        make_fixture(4, 2, 4, 3),
+        make_fixture(5, 3, 2, 3),
+        make_fixture(6, 4, 1, 3, 2, 5),
+        make_fixture(7, 4, 4, 1, 3, 4),
+        make_fixture(8, 4, 2, 4),
+        make_fixture(9, 5, 1, 2),
+        make_fixture(10, None, 3, 4),  # Postponed, so not in any gameweek
+    ]
+
+
+def test_matrix_starts_at_the_first_unplayed_gameweek():
+    matrix = build_fixture_matrix(make_fixtures())
+    assert matrix.team_ids.tolist() == [1, 2, 3, 4]
+    assert matrix.gameweeks.tolist() == [2, 3, 4, 5]
+    assert matrix.counts.tolist() == [
+        [1, 0, 2, 1],
+        [1, 1, 1, 1],
+        [1, 1, 1, 0],
+        [1, 0, 2, 0],
+    ]
+
+
+def test_blank_and_double_gameweeks_are_summed():
+    matrix = build_fixture_matrix(make_fixtures())
+    team_1 = matrix.rows_for([1])[0]
+    assert matrix.difficulty[team_1].tolist() == [2, 0, 2 + 4, NEUTRAL_DIFFICULTY]
+    assert matrix.weights[team_1].tolist() == pytest.approx([difficulty_weight(2), 0, difficulty_weight(2) + difficulty_weight(4), 1])
+
+    # Averaged per gameweek, the double makes up for the blank
+    assert matrix.team_weights(4)[team_1] == pytest.approx(sum(matrix.weights[team_1]) / 4)
+
+
+def test_horizon_cuts_off_later_gameweeks():
+    matrix = build_fixture_matrix(make_fixtures(), horizon=2)
+    assert matrix.gameweeks.tolist() == [2, 3]
+    assert matrix.counts.sum() == 6
+
+    # Asking for more weeks than the matrix covers averages over the weeks it has
+    assert np.array_equal(matrix.team_weights(5), matrix.team_weights(2))
+
+
+def test_fixture_weights_of_unknown_teams_are_neutral():
+    matrix = build_fixture_matrix(make_fixtures())
+    weights = matrix.fixture_weights([1, 99, -1, 3], 3)
+    assert weights[1] == weights[2] == 1.0
+    assert weights[0] == pytest.approx(matrix.team_weights(3)[0])
+    assert weights[3] == pytest.approx(matrix.team_weights(3)[2])
+
+
+def test_finished_season_weighs_everyone_the_same():
+    fixtures = [dict(fixture, finished=True) for fixture in make_fixtures()]
+    matrix = build_fixture_matrix(fixtures)
+    assert len(matrix.gameweeks) == 0
+    assert matrix.fixture_weights([1, 2, 3, 4]).tolist() == [1.0] * 4
+
+
+def test_matrix_is_rebuilt_only_when_the_fixtures_change(monkeypatch):
+    monkeypatch.setattr(fixture_matrix, '_fixture_matrix', (None, None))
+    builds = []
+    build = fixture_matrix.build_fixture_matrix
+    monkeypatch.setattr(fixture_matrix, 'build_fixture_matrix', lambda fixtures: builds.append(1) or build(fixtures))
+
+    fixtures = make_fixtures()
+    matrix = get_fixture_matrix(fixtures)
+    # A payload parsed again with the same content is a hit
+    assert get_fixture_matrix(copy.deepcopy(fixtures)) is matrix
+    assert len(builds) == 1
+
+    changed = copy.deepcopy(fixtures)
+    changed[2]['finished'] = True
+    rebuilt = get_fixture_matrix(changed)
+    assert rebuilt is not matrix
+    assert rebuilt.gameweeks.tolist() == [2, 3, 4, 5]
+    assert rebuilt.counts[rebuilt.rows_for([1])[0]].tolist() == [0, 0, 2, 1]
+    assert len(builds) == 2
+
+    # A missing feed counts as no fixtures, and is cached like any other
+    assert get_fixture_matrix(None) is get_fixture_matrix([])
+    assert len(builds) == 3
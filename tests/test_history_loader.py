@@ -0,0 +1,173 @@
+import os
+import random
+import requests
+import numpy as np
+import pytest
+from app import history_loader
+from app.history_loader import load_histories, update_histories
+from app.history_store import HISTORY_FILE, WINDOW_SIZE, HistoryTable, build_history_table, load_history_table
+
+# Class to stand in for the FPL cache, serving canned element-summary and live gameweek payloads and failing for some players
+class FakeCache:
+    def __init__(self, data_dir, histories, failing=(), live=None):
+        self.data_dir = str(data_dir)
+        self.histories = histories
+        self.failing = set(failing)
+        self.live = live or {}
+        self.requests = []
+
+    def get_uncached(self, endpoint):
+        self.requests.append(endpoint)
+        if endpoint.startswith("event/"):
+            return self.live[int(endpoint.split('/')[1])]
+        player_id = int(endpoint.split('/')[1])
+        if player_id in self.failing:
+            raise requests.ConnectionError("upstream is down")
+        return {'history': self.histories[player_id]}
+
+# Function to make the element-summary history of a player, one fixture per round
+def make_history(player_id, rounds):
+    return [{'fixture': round_id * 10 + player_id, 'round': round_id, 'total_points': player_id + round_id, 'minutes': 90} for round_id in rounds]
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(history_loader, 'RETRY_DELAY', 0)
+
+
+def test_failed_history_is_left_out_and_fetched_again(tmp_path):
+    histories = {player_id: make_history(player_id, range(1, 6)) for player_id in (1, 2, 3)}
+    cache = FakeCache(tmp_path, histories, failing={2})
+
+    table = load_histories([1, 2, 3], cache=cache)
+    assert table.missing == {2}
+    assert list(table.player_ids) == [1, 3]
+    assert cache.requests.count("element-summary/2") == history_loader.FETCH_ATTEMPTS
+
+    # The saved table remembers the player, so a later load fetches them again rather than keeping no history
+    assert load_history_table(cache.data_dir).missing == {2}
+    cache.failing.clear()
+    table = load_histories([1, 2, 3], cache=cache)
+    assert table.missing == set()
+    assert list(table.player_ids) == [1, 2, 3]
+    assert table.player_rows(2)['total_points'].tolist() == [3, 4, 5, 6, 7]
+    assert load_history_table(cache.data_dir).missing == set()
+
+
+def test_saved_table_is_reused_until_a_gameweek_is_completed(tmp_path):
+    histories = {player_id: make_history(player_id, range(1, 6)) for player_id in (1, 2, 3)}
+    events = [{'id': round_id, 'finished': round_id <= 5, 'data_checked': round_id <= 5} for round_id in range(1, 39)]
+    cache = FakeCache(tmp_path, histories)
+    load_histories([1, 2, 3], events, cache=cache)
+
+    # However old the file is, a table that covers every completed gameweek is not fetched again
+    filepath = os.path.join(cache.data_dir, HISTORY_FILE)
+    os.utime(filepath, (0, 0))
+    cache.requests.clear()
+    table = load_histories([1, 2, 3], events, cache=cache)
+    assert cache.requests == []
+    assert table.complete_round == 5
+
+    events[5].update(finished=True, data_checked=True)
+    table = load_histories([1, 2, 3], events, cache=cache)
+    assert sorted(cache.requests) == [f"element-summary/{player_id}" for player_id in (1, 2, 3)]
+    assert table.complete_round == 6
+
+
+def test_update_fetches_missing_histories(tmp_path):
+    histories = {player_id: make_history(player_id, range(1, 6)) for player_id in (1, 2)}
+    cache = FakeCache(tmp_path, histories, failing={2})
+    table = load_histories([1, 2], cache=cache)
+
+    cache.failing.clear()
+    updated, changed_ids = update_histories(table, [], [], [], cache=cache)
+    assert changed_ids == {2}
+    assert updated.missing == set()
+    assert updated.player_rows(2)['round'].tolist() == [1, 2, 3, 4, 5]
+    assert len(updated.player_rows(1)) == 5
+
+
+# Function to make a season of two home-and-away pairings, returning the fixtures, players and each player's full history
+def make_season(rounds):
+    players_data = [{'id': player_id, 'team': (player_id + 1) // 2, 'now_cost': 50 + player_id} for player_id in range(1, 9)]
+    fixtures = []
+    for round_id in rounds:
+        for home, away in ((1, 2), (3, 4)) if round_id % 2 else ((2, 1), (4, 3)):
+            fixtures.append({'id': round_id * 10 + home, 'event': round_id, 'team_h': home, 'team_a': away})
+
+    histories = {player_data['id']: [] for player_data in players_data}
+    for fixture in fixtures:
+        for player_data in players_data:
+            if player_data['team'] in (fixture['team_h'], fixture['team_a']):
+                was_home = player_data['team'] == fixture['team_h']
+                histories[player_data['id']].append({
+                    'fixture': fixture['id'],
+                    'round': fixture['event'],
+                    'opponent_team': fixture['team_a'] if was_home else fixture['team_h'],
+                    'was_home': was_home,
+                    'minutes': 90,
+                    'total_points': (player_data['id'] * 7 + fixture['event'] * 3) % 11,
+                    'value': player_data['now_cost'],
+                })
+    return fixtures, players_data, histories
+
+# Function to make the live payload of a gameweek from the full histories
+def make_live(histories, round_id):
+    return {'elements': [
+        {'id': player_id, 'stats': {'minutes': entry['minutes'], 'total_points': entry['total_points']}, 'explain': []}
+        for player_id, history in histories.items() for entry in history if entry['round'] == round_id
+    ]}
+
+
+def test_update_replaces_rows_of_a_gameweek_fetched_while_it_was_played(tmp_path):
+    fixtures, players_data, histories = make_season(range(1, 38))
+    full = build_history_table(histories)
+
+    # Built part-way through gameweek 37, when only the home sides had played
+    partial = {
+        player_id: [entry for entry in history if entry['round'] < 37 or entry['was_home']]
+        for player_id, history in histories.items()
+    }
+    events = [{'id': round_id, 'finished': round_id < 37, 'data_checked': round_id < 37} for round_id in range(1, 39)]
+    cache = FakeCache(tmp_path, partial, live={37: make_live(histories, 37)})
+    table = load_histories(list(partial), events, cache=cache)
+    assert table.complete_round == 36
+    table.window_sums('total_points')
+
+    # Nothing new is finished yet, so the provisional rows stay
+    same, changed_ids = update_histories(table, events, players_data, fixtures, cache=cache)
+    assert same is table and changed_ids == set()
+
+    events[36].update(finished=True, data_checked=True)
+    updated, changed_ids = update_histories(table, events, players_data, fixtures, cache=cache)
+    assert changed_ids == set(histories)
+    assert updated.complete_round == 37
+    assert np.array_equal(np.asarray(updated.rows), np.asarray(full.rows))
+    assert np.array_equal(updated.window_sums('total_points'), full.window_sums('total_points'))
+
+    # The saved table remembers the gameweek, so the next update leaves it alone
+    reloaded = load_history_table(cache.data_dir)
+    assert reloaded.complete_round == 37
+    assert update_histories(reloaded, events, players_data, fixtures, cache=cache) == (reloaded, set())
+
+
+def test_append_carries_rolling_sums_forward():
+    rng = random.Random(7)
+    histories = {player_id: make_history(player_id, range(1, rng.randint(0, 12))) for player_id in range(1, 30)}
+    table = build_history_table(histories)
+    names = ('total_points', 'minutes', 'games')
+    for name in names:
+        table.window_sums(name)
+
+    # New rows for players with full windows, short windows and no history at all, some with two rows at once
+    entries = []
+    for player_id in rng.sample(range(1, 40), 25):
+        for round_id in range(20, 20 + rng.randint(1, 2)):
+            entries.append(dict(make_history(player_id, [round_id])[0], element=player_id))
+    new_rows = np.concatenate([build_history_table({entry['element']: [entry]}).rows for entry in entries])
+
+    appended = table.append(new_rows)
+    rebuilt = HistoryTable(np.asarray(appended.rows))
+    assert np.array_equal(appended.player_ids, rebuilt.player_ids)
+    for name in names:
+        assert np.array_equal(appended.window_totals[name], rebuilt.window_sums(name)), name
+    assert np.array_equal(appended.window_counts(), np.minimum(np.diff(rebuilt.offsets), WINDOW_SIZE))
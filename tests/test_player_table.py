@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from app.player_table import PlayerTable, intern_names
+
+# Function to make a table of players with the given scores as their form
+def make_table(forms):
+    count = len(forms)
+    name_ids, names = intern_names([f"P{row}" for row in range(count)])
+    return PlayerTable(
+        ids=np.arange(1, count + 1, dtype=np.int32),
+        position_ids=np.ones(count, dtype=np.int8),
+        team_ids=np.ones(count, dtype=np.int16),
+        forms=np.asarray(forms, dtype=np.float64),
+        predicted=np.asarray(forms, dtype=np.float64),
+        points=np.zeros(count, dtype=np.int32),
+        values=np.full(count, 50, dtype=np.int16),
+        name_ids=name_ids,
+        names=names,
+        club_names={1: "Club 1"},
+    )
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_top_matches_a_full_stable_sort(seed):
+    rng = np.random.default_rng(seed)
+    # Few distinct scores, so ties fall on the k-th place as often as not
+    table = make_table(rng.integers(0, 6, size=200) / 2)
+    rows = np.sort(rng.choice(200, size=rng.integers(1, 200), replace=False))
+    for k in (0, 1, 2, 5, 10, len(rows) - 1, len(rows), len(rows) + 5):
+        expected = rows[np.argsort(-table.forms[rows], kind='stable')[:k]]
+        assert [player.row for player in table.top(rows, table.forms, k)] == expected.tolist()
+
+
+def test_top_keeps_players_without_a_score_last():
+    table = make_table([1.0, np.nan, 3.0, np.nan, 2.0])
+    rows = np.arange(5)
+    assert [player.row for player in table.top(rows, table.forms, 4)] == [2, 4, 0, 1]
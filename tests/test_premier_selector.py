@@ -0,0 +1,19 @@
+from app import premier_selector
+from app.history_store import build_history_table
+from app.premier_selector import compute_player_metrics
+
+
+def test_metrics_of_removed_players_are_dropped(monkeypatch):
+    monkeypatch.setattr(premier_selector, '_player_metrics', {})
+    history = build_history_table({
+        player_id: [{'fixture': round_id, 'round': round_id, 'total_points': player_id + round_id, 'minutes': 90} for round_id in range(1, 6)]
+        for player_id in (1, 2, 3)
+    })
+    players_data = [{'id': player_id, 'element_type': 2, 'team': 1, 'now_cost': 50} for player_id in (1, 2, 3)]
+    metrics = compute_player_metrics(players_data, None, history)
+    assert set(premier_selector._player_metrics) == {1, 2, 3}
+
+    # Player 3 has left the league, and nobody else changed
+    updated = compute_player_metrics(players_data[:2], None, history, changed_ids=set())
+    assert set(premier_selector._player_metrics) == {1, 2}
+    assert updated == {player_id: metrics[player_id] for player_id in (1, 2)}
@@ -0,0 +1,113 @@
+from collections import Counter
+import numpy as np
+import pytest
+from app import routes, squad_optimizer
+from app.figure_cache import VersionedLRU
+from app.player_table import PlayerTable, intern_names
+from app.squad_optimizer import MAX_PER_CLUB, SQUAD_BUDGET, SQUAD_POSITIONS, STARTING_POSITIONS, STARTING_SIZE, optimize_squad
+
+# Seconds given to the solver, long enough for a table this small to be solved to optimality
+TIME_LIMIT = 10
+
+# Function to make a table of players spread over positions and clubs, with prices that go up with their scores
+def make_table(seed, count=80, clubs=8):
+    rng = np.random.default_rng(seed)
+    predicted = np.round(rng.uniform(0, 8, size=count), 1)
+    values = np.clip(np.round(45 + predicted * 5 + rng.integers(-20, 21, size=count)), 40, 130)
+    # Every position gets players, so a full squad can always be picked
+    position_ids = np.resize(np.array([1, 2, 2, 3, 3, 4, 2, 3, 4, 1]), count)
+    name_ids, names = intern_names([f"P{row}" for row in range(count)])
+    return PlayerTable(
+        ids=np.arange(1, count + 1, dtype=np.int32),
+        position_ids=position_ids.astype(np.int8),
+        team_ids=rng.integers(1, clubs + 1, size=count).astype(np.int16),
+        forms=predicted,
+        predicted=predicted,
+        points=np.zeros(count, dtype=np.int32),
+        values=values.astype(np.int16),
+        name_ids=name_ids,
+        names=names,
+        club_names={team_id: f"Club {team_id}" for team_id in range(1, clubs + 1)},
+    )
+
+# Function to check a squad keeps every FPL rule
+def assert_valid(squad, budget=SQUAD_BUDGET):
+    assert Counter(player.position_id for player in squad.players) == SQUAD_POSITIONS
+    assert squad.cost <= budget
+    assert max(Counter(player.club for player in squad.players).values()) <= MAX_PER_CLUB
+
+    assert len(squad.starting_xi) == STARTING_SIZE
+    assert set(squad.starting_xi) <= set(squad.players)
+    starting = Counter(player.position_id for player in squad.starting_xi)
+    for position_id, (low, high) in STARTING_POSITIONS.items():
+        assert low <= starting[position_id] <= high
+    assert len(squad.bench) == len(squad.players) - STARTING_SIZE
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_squad_keeps_the_rules(seed):
+    squad = optimize_squad(make_table(seed), time_limit=TIME_LIMIT)
+    assert squad.optimal
+    assert_valid(squad)
+
+
+def test_tighter_budget_is_kept():
+    table = make_table(1)
+    squad = optimize_squad(table, budget=800, time_limit=TIME_LIMIT)
+    assert_valid(squad, budget=800)
+    assert squad.projected_form <= optimize_squad(table, time_limit=TIME_LIMIT).projected_form
+
+
+def test_locked_players_are_picked_and_excluded_players_are_not():
+    table = make_table(2)
+    best = optimize_squad(table, time_limit=TIME_LIMIT)
+
+    # Lock in the worst player of a position and leave out the best starter
+    left_out = max(best.starting_xi, key=lambda player: player.predicted)
+    locked = min((player for player in table if player.position_id == 3), key=lambda player: player.predicted)
+    squad = optimize_squad(table, locked_ids=[locked.id], excluded_ids=[left_out.id], time_limit=TIME_LIMIT)
+    assert_valid(squad)
+    assert locked.id in {player.id for player in squad.players}
+    assert left_out.id not in {player.id for player in squad.players}
+
+
+def test_player_locked_and_excluded_raises_value_error():
+    with pytest.raises(ValueError):
+        optimize_squad(make_table(0), locked_ids=[1], excluded_ids=[1])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pruning_leaves_the_optimum_unchanged(seed, monkeypatch):
+    # Enough clubs that a player can be dominated by better, cheaper players from more clubs than a squad can fill
+    table = make_table(seed, count=200, clubs=20)
+    pruned = optimize_squad(table, time_limit=TIME_LIMIT)
+    assert len(squad_optimizer.prune_dominated(list(table), lambda player: player.predicted, set())) < len(table)
+
+    monkeypatch.setattr(squad_optimizer, 'prune_dominated', lambda players, score, locked_ids: players)
+    full = optimize_squad(table, time_limit=TIME_LIMIT)
+    assert pruned.optimal and full.optimal
+    assert pruned.projected_form == pytest.approx(full.projected_form)
+    squad_score = lambda squad: sum(player.predicted for player in squad.players)
+    assert squad_score(pruned) == pytest.approx(squad_score(full))
+
+
+# Class to stand in for a data snapshot holding a player table
+class FakeSnapshot:
+    def __init__(self, players, version):
+        self.players = players
+        self.version = version
+
+
+def test_squad_is_picked_once_per_data_version(monkeypatch):
+    calls = []
+    monkeypatch.setattr(routes, 'optimize_squad', lambda players, **kwargs: calls.append(kwargs) or optimize_squad(players, **kwargs))
+    monkeypatch.setattr(routes, 'squad_cache', VersionedLRU(routes.SQUAD_CACHE_BYTES))
+    table = make_table(3)
+
+    squad = routes.pick_squad(FakeSnapshot(table, 1), locked_ids=[5, 2], excluded_ids=[7])
+    assert routes.pick_squad(FakeSnapshot(table, 1), locked_ids=[2, 5, 5], excluded_ids=[7]) is squad
+    assert len(calls) == 1
+
+    routes.pick_squad(FakeSnapshot(table, 1))
+    routes.pick_squad(FakeSnapshot(table, 2), locked_ids=[2, 5], excluded_ids=[7])
+    assert len(calls) == 3